@@ -0,0 +1,579 @@
+# Description: This script contains the benchmarks of the counting engine. The benchmarks use synthetic detections and synthetic videos, so they don't need a GPU, YOLO weights or a real video file.
+# Usage: python benchmark.py <benchmark> [options]
+
+# Import necessary libraries
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import queue
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+import supervision as sv
+import counter as counter_module
+import protocol
+from cache import DetectionCache
+from counter import Counter, SELECTED_CLASSES, chunk_pool, count_class_intervals, interval_edges
+from detectors import IMGSZ, load_detector
+from synthetic import PixelCounter, legacy_count_intervals, random_zones, scene_crossings, synthetic_detections, synthetic_scene, synthetic_video
+from result_store import ResultStore
+from zones import LineSet, PolygonSet
+
+# a counter that uses a stub detector instead of YOLO: it does the batched preprocessing of a real detector, waits for a fixed call latency and returns the synthetic detections of each frame
+class StubCounter(Counter):
+    def __init__(self, rois:list, video_file:str, detections:list, latency:float=0.0):
+        super().__init__(rois, 'synthetic')
+        self.video_file = video_file # use the path as it is, instead of the assets folder of the server
+        self.detections = detections
+        self.latency = latency
+        self.index = 0
+
+    def detect(self, frames:list) -> list:
+        cv2.dnn.blobFromImages(frames, 1 / 255, (640, 640), swapRB=True) # the resizing and normalization of a real detector, done for the whole batch at once
+        time.sleep(self.latency) # the fixed cost of one call to the detector(kernel launches, synchronization)
+        detections = [
+            sv.Detections(xyxy=xyxy.copy(), confidence=confidence.copy(), class_id=class_id.copy()) for xyxy, confidence, class_id in self.detections[self.index:self.index + len(frames)]
+        ]
+        self.index += len(frames)
+        return detections
+
+# the per-frame path used before the shared conversion: the detections are rebuilt for each class, and each class has its own tracker and line zone
+class LegacyCounter:
+    def __init__(self, rois:list):
+        self.byte_tracker = {key: sv.ByteTrack(track_activation_threshold=0.25, lost_track_buffer=30, minimum_matching_threshold=0.7, frame_rate=30) for key in SELECTED_CLASSES}
+        self.line_zones = [{key: sv.LineZone(start=sv.Point(*roi['start']), end=sv.Point(*roi['end'])) for key in SELECTED_CLASSES} for roi in rois]
+        self.counter = [{key: 0 for key in SELECTED_CLASSES} for roi in rois]
+        self.frame_counter = [{key: [] for key in SELECTED_CLASSES} for roi in rois]
+
+    def update(self, xyxy, confidence, class_id, index):
+        for key in SELECTED_CLASSES:
+            detections = sv.Detections(xyxy=xyxy.copy(), confidence=confidence.copy(), class_id=class_id.copy()) # stands in for sv.Detections.from_ultralytics
+            detections = detections[detections.class_id == SELECTED_CLASSES[key]]
+            detections = self.byte_tracker[key].update_with_detections(detections)
+            for i, line_zone in enumerate(self.line_zones):
+                line_zone = line_zone[key]
+                line_zone.trigger(detections)
+                if line_zone.in_count + line_zone.out_count > self.counter[i][key]:
+                    self.counter[i][key] = line_zone.in_count + line_zone.out_count
+                    self.frame_counter[i][key].append(index)
+
+# benchmark the per-frame CPU overhead of the counting path(detection conversion, filtering, tracking and line crossing) before and after the shared conversion
+def bench_frame(args):
+    frames = synthetic_detections(args.frames, args.objects)
+    rois = [{'start': (960, 0), 'end': (960, 1080)}]
+    legacy = LegacyCounter(rois)
+    counter = Counter(rois, 'synthetic')
+
+    start = time.perf_counter()
+    for index, (xyxy, confidence, class_id) in enumerate(frames):
+        legacy.update(xyxy, confidence, class_id, index)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for index, (xyxy, confidence, class_id) in enumerate(frames):
+        counter.update(sv.Detections(xyxy=xyxy.copy(), confidence=confidence.copy(), class_id=class_id.copy()), index)
+    counter_time = time.perf_counter() - start
+
+    print(f"frames: {args.frames}, objects: {args.objects}")
+    print(f"legacy: {legacy_time / args.frames * 1000:.3f} ms/frame")
+    print(f"shared: {counter_time / args.frames * 1000:.3f} ms/frame ({legacy_time / counter_time:.2f}x)")
+    for key in SELECTED_CLASSES:
+        print(f"{key}: legacy {legacy.counter[0][key]}, shared {len(counter.frame_counter[0][key])}")
+
+
+# benchmark the frames per second of Counter.process for several batch sizes, with a stub detector or a small YOLO model
+def bench_batch(args):
+    rois = [{'start': (960, 0), 'end': (960, 1080)}]
+    with tempfile.TemporaryDirectory() as directory:
+        video_file = synthetic_video(os.path.join(directory, "synthetic.mp4"), args.frames)
+        detections = synthetic_detections(args.frames, args.objects)
+        model = None
+        if args.model:
+            model = load_detector('ultralytics', args.model) # only needed for a real model
+        for batch_size in args.batch_sizes:
+            if model is None:
+                counter = StubCounter(rois, video_file, detections, args.latency / 1000)
+            else:
+                counter = Counter(rois, 'synthetic', model)
+                counter.video_file = video_file
+            start = time.perf_counter()
+            result = counter.process(batch_size=batch_size, queue_size=args.queue_size)
+            elapsed = time.perf_counter() - start
+            if isinstance(result, dict):
+                print(f"batch size {batch_size}: {result['error']}")
+                continue
+            print(f"batch size {batch_size}: {args.frames / elapsed:.1f} fps")
+
+
+# load test of the socket server: many simulated clients send a request at the same time to a server whose workers use a stub calculate function
+def bench_server(args):
+    import server # imported here, so that the other benchmarks don't need the server
+
+    def stub_calculate(roi_coordinates, model, progress=None, timer=None): # takes job_time like a real job, without a model or a video
+        time.sleep(args.job_time / 1000)
+        return [dict({key: [0.0] * 6 for key in SELECTED_CLASSES}, color=roi['color']) for roi in roi_coordinates]
+
+    ready = threading.Event()
+    threading.Thread(target=server.serve, args=('127.0.0.1', args.port, args.workers, args.queue_size, server.ModelPool(args.workers), stub_calculate, ready), daemon=True).start()
+    ready.wait()
+    request = [{'start': (960, 0), 'end': (960, 1080), 'color': 'blue', 'video': 'synthetic'}]
+
+    def client(_): # send one request and measure the time until the job id and until the results
+        start = time.perf_counter()
+        with socket.create_connection(('127.0.0.1', args.port)) as s:
+            protocol.send_message(s, protocol.REQUEST, request)
+            message_type, _, _ = protocol.recv_message(s)
+            accepted = time.perf_counter() - start
+            if message_type != protocol.ACCEPTED:
+                return 'busy', accepted, None
+            protocol.recv_message(s)
+        return 'done', accepted, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        results = list(pool.map(client, range(args.clients)))
+    elapsed = time.perf_counter() - start
+    accepted = np.array([result[1] for result in results]) * 1000
+    latency = np.array([result[2] for result in results if result[0] == 'done']) * 1000
+    print(f"clients: {args.clients}, workers: {args.workers}, queue size: {args.queue_size}, job time: {args.job_time} ms")
+    print(f"done: {len(latency)}, busy: {args.clients - len(latency)}")
+    print(f"time to answer(ms): p50 {np.percentile(accepted, 50):.1f}, p95 {np.percentile(accepted, 95):.1f}, max {accepted.max():.1f}")
+    if len(latency):
+        print(f"time to results(ms): p50 {np.percentile(latency, 50):.1f}, p95 {np.percentile(latency, 95):.1f}, max {latency.max():.1f}")
+    print(f"throughput: {len(latency) / elapsed:.2f} jobs/s")
+
+
+# loopback throughput of the wire protocol: send results with many intervals(several megabytes) through a TCP connection and measure the throughput of each encoding(the correctness is tested in tests/test_protocol.py)
+def bench_protocol(args):
+    rng = np.random.default_rng(0)
+    message = [
+        dict({key: rng.integers(0, 100, args.intervals).astype(float).tolist() for key in SELECTED_CLASSES}, color=color) for color in ['blue', 'green', 'red']
+    ]
+    encodings = {'json': protocol.JSON}
+    if protocol.msgpack is not None:
+        encodings['msgpack'] = protocol.MSGPACK
+    with socket.create_server(('127.0.0.1', 0)) as listener:
+        received = queue.Queue()
+        def receive(): # the receiving side, reads one message for each encoding
+            conn, _ = listener.accept()
+            with conn:
+                for _ in encodings:
+                    received.put(protocol.recv_message(conn))
+        thread = threading.Thread(target=receive)
+        thread.start()
+        with socket.create_connection(listener.getsockname()) as s:
+            for name, encoding in encodings.items():
+                size = len(protocol.encode(message, encoding))
+                start = time.perf_counter()
+                protocol.send_message(s, protocol.RESULT, message, encoding)
+                message_type, body, _ = received.get() # wait until the message is received and decoded
+                elapsed = time.perf_counter() - start
+                complete = message_type == protocol.RESULT and body == message # checked by tests/test_protocol.py, only reported here
+                print(f"{name}: {size / 1e6:.1f} MB in {elapsed * 1000:.1f} ms({size / 1e6 / elapsed:.1f} MB/s), received completely: {complete}")
+        thread.join()
+
+
+# compare the time of the TrackStore crossings with sv.LineZone replayed on the recorded tracks, for the line used while tracking and for random new lines(the correctness is tested in tests/test_tracks.py)
+def bench_tracks(args):
+    frames = synthetic_detections(args.frames, args.objects)
+    rng = np.random.default_rng(1)
+    lines = [((960, 0), (960, 1080))] + [
+        (tuple(rng.integers(0, [1920, 1080]).tolist()), tuple(rng.integers(0, [1920, 1080]).tolist())) for _ in range(args.lines)
+    ]
+    counter = Counter([{'start': lines[0][0], 'end': lines[0][1]}], 'synthetic')
+    tracked = [
+        counter.update(sv.Detections(xyxy=xyxy.copy(), confidence=confidence.copy(), class_id=class_id.copy()), index) for index, (xyxy, confidence, class_id) in enumerate(frames)
+    ] # the tracked detections of each frame
+    replay_time = query_time = 0
+    same = True
+    for start, end in lines:
+        begin = time.perf_counter()
+        line_zone = sv.LineZone(start=sv.Point(*start), end=sv.Point(*end))
+        expected = []
+        for index, detections in enumerate(tracked): # replay the line zone frame by frame
+            crossed_in, crossed_out = line_zone.trigger(detections)
+            expected += [(index, class_id, True) for class_id in detections.class_id[crossed_in]]
+            expected += [(index, class_id, False) for class_id in detections.class_id[crossed_out]]
+        replay_time += time.perf_counter() - begin
+        begin = time.perf_counter()
+        crossings = list(zip(*[column.tolist() for column in counter.tracks.crossings(start, end)]))
+        query_time += time.perf_counter() - begin
+        same = same and sorted(crossings) == sorted((index, int(class_id), crossed) for index, class_id, crossed in expected) # tested in tests/test_tracks.py, only reported here
+    print(f"frames: {args.frames}, objects: {args.objects}, lines: {len(lines)}, crossings of the first line: {len(counter.tracks.crossings(*lines[0])[0])}")
+    print(f"LineZone replay: {replay_time / len(lines) * 1000:.2f} ms/line")
+    print(f"TrackStore query: {query_time / len(lines) * 1000:.2f} ms/line ({replay_time / query_time:.1f}x), same crossings as sv.LineZone: {same}")
+
+
+# compare the time of the vectorized interval counting with the legacy function on large lists of crossings(the edge cases are tested in tests/test_intervals.py)
+def bench_intervals(args):
+    rng = np.random.default_rng(0)
+    numbers = {key: rng.integers(1, args.frames, args.crossings).tolist() for key in SELECTED_CLASSES}
+    start = time.perf_counter()
+    expected = {key: legacy_count_intervals(numbers[key], args.frames, args.intervals) for key in numbers}
+    legacy_time = time.perf_counter() - start
+    start = time.perf_counter()
+    counts = count_class_intervals(numbers, interval_edges(args.frames, args.intervals))
+    vectorized_time = time.perf_counter() - start
+    print(f"crossings: {args.crossings} for each of {len(numbers)} classes, intervals: {args.intervals}")
+    print(f"legacy: {legacy_time * 1000:.1f} ms")
+    print(f"vectorized: {vectorized_time * 1000:.1f} ms ({legacy_time / vectorized_time:.0f}x), same counts: {counts == expected}")
+
+
+# compare the counts and the time of full-rate processing with the frame stride and the motion gate, on a synthetic video with long static stretches and the stub detector
+def bench_stride(args):
+    rois = [{'start': (args.width // 2, 0), 'end': (args.width // 2, args.height)}]
+    with tempfile.TemporaryDirectory() as directory:
+        objects = synthetic_scene(args.frames, args.objects, args.width, args.height, active_fraction=args.active_fraction, separate=True)
+        video_file = synthetic_video(os.path.join(directory, "synthetic.mp4"), args.frames, objects, args.width, args.height)
+        full = None
+        for stride, motion_gate in [(1, False), (1, True), (2, False), (3, False), (2, True)]:
+            counter = PixelCounter(rois, video_file)
+            start = time.perf_counter()
+            result = counter.process(stride=stride, motion_gate=motion_gate)
+            elapsed = time.perf_counter() - start
+            if isinstance(result, dict):
+                print(f"stride {stride}, motion gate {motion_gate}: {result['error']}")
+                continue
+            counts = {key: int(sum(result[0][key])) for key in SELECTED_CLASSES}
+            full = full or (counts, elapsed)
+            difference = sum(abs(counts[key] - full[0][key]) for key in counts)
+            print(f"stride {stride}, motion gate {str(motion_gate):5}: {elapsed:.2f} s ({full[1] / elapsed:.2f}x), skipped {result[0]['skipped']:.0%}, counts {counts}, difference from full rate {difference}")
+
+
+# compare the time and the counts of full-frame inference with the inference on the crop region around the line(and on its tiles), on a synthetic 4K video and the stub detector
+def bench_crop(args):
+    rois = [{'start': (args.width // 2, 0), 'end': (args.width // 2, args.height)}]
+    with tempfile.TemporaryDirectory() as directory:
+        objects = synthetic_scene(args.frames, args.objects, args.width, args.height)
+        video_file = synthetic_video(os.path.join(directory, "synthetic.mp4"), args.frames, objects, args.width, args.height)
+        full = None
+        for name, options in [('full frame', {}), ('crop', {'crop': True, 'crop_padding': args.padding}), ('crop tiles', {'crop': True, 'crop_padding': args.padding, 'tile_size': args.tile_size})]:
+            counter = PixelCounter(rois, video_file)
+            start = time.perf_counter()
+            result = counter.process(**options)
+            elapsed = time.perf_counter() - start
+            if isinstance(result, dict):
+                print(f"{name}: {result['error']}")
+                continue
+            counts = {key: int(sum(result[0][key])) for key in SELECTED_CLASSES}
+            full = full or (counts, elapsed)
+            tiles = f", {len(counter.tiles)} tiles of {counter.tiles[0][2] - counter.tiles[0][0]}x{counter.tiles[0][3] - counter.tiles[0][1]}" if counter.tiles else ""
+            print(f"{name:10}: {elapsed:.2f} s ({full[1] / elapsed:.2f}x){tiles}, counts {counts}, same as full frame: {counts == full[0]}")
+
+
+# measure the speedup of processing the chunks of a synthetic video in parallel as processes are added(the counts are tested against the sequential run in tests/test_chunks.py)
+def bench_chunks(args):
+    rois = [{'start': (args.width // 2, 0), 'end': (args.width // 2, args.height), 'intervals': args.intervals}]
+    with tempfile.TemporaryDirectory() as directory:
+        objects = synthetic_scene(args.frames, args.objects, args.width, args.height)
+        video_file = synthetic_video(os.path.join(directory, "synthetic.mp4"), args.frames, objects, args.width, args.height)
+        start = time.perf_counter()
+        expected = PixelCounter(rois, video_file).process()
+        sequential_time = time.perf_counter() - start
+        print(f"sequential: {sequential_time:.2f} s, counts {({key: int(sum(expected[0][key])) for key in SELECTED_CLASSES})}")
+        for processes in args.processes:
+            list(chunk_pool(processes, ('stub', None, None)).map(time.sleep, [0.5] * processes)) # start the worker processes before measuring
+            start = time.perf_counter()
+            result = PixelCounter(rois, video_file).process(chunks=processes, chunk_overlap=args.overlap)
+            elapsed = time.perf_counter() - start
+            print(f"{processes} chunks: {elapsed:.2f} s ({sequential_time / elapsed:.2f}x), same per-interval counts as sequential: {result == expected}") # tested in tests/test_chunks.py, only reported here
+
+
+# a function that parses a detector spec of the command line: backend[:path[:imgsz]]
+def parse_spec(text):
+    parts = text.split(':')
+    return parts[0], parts[1] if len(parts) > 1 else None, int(parts[2]) if len(parts) > 2 else IMGSZ
+
+# a function that matches the detections of a frame with the reference detections of the same class at IoU >= iou, and returns the number of matches
+def match_detections(detections: sv.Detections, reference: sv.Detections, iou:float=0.5):
+    if len(detections) == 0 or len(reference) == 0:
+        return 0
+    ious = sv.box_iou_batch(detections.xyxy, reference.xyxy)
+    ious[detections.class_id[:, None] != reference.class_id[None, :]] = 0 # only the same class can match
+    matched = 0
+    for i in np.argsort(-detections.confidence): # the most confident detections are matched first
+        j = ious[i].argmax()
+        if ious[i, j] >= iou:
+            ious[:, j] = 0 # each reference detection is matched once
+            matched += 1
+    return matched
+
+# compare the ms/frame of detector backends and their precision/recall against a reference backend on the same clip(a synthetic clip and the stub detector if no video is given)
+def bench_backends(args):
+    with tempfile.TemporaryDirectory() as directory:
+        video_file = args.video or synthetic_video(os.path.join(directory, "synthetic.mp4"), args.frames, synthetic_scene(args.frames, args.objects, args.width, args.height), args.width, args.height)
+        frames = list(sv.get_video_frames_generator(video_file, end=args.frames))
+    reference = None
+    for spec in [parse_spec(text) for text in [args.reference] + args.backends]:
+        detector = load_detector(*spec)
+        detector.detect(frames[:args.batch_size]) # warm up(lazy initialization, memory allocation)
+        start = time.perf_counter()
+        detections = []
+        for i in range(0, len(frames), args.batch_size):
+            detections += detector.detect(frames[i:i + args.batch_size])
+        elapsed = time.perf_counter() - start
+        reference = reference or (detector.name, detections) # the first detector is the reference
+        matched = sum(match_detections(d, r, args.iou) for d, r in zip(detections, reference[1]))
+        total, expected = sum(map(len, detections)), sum(map(len, reference[1]))
+        print(f"{detector.name}: {elapsed / len(frames) * 1000:.2f} ms/frame, precision {matched / max(total, 1):.3f}, recall {matched / max(expected, 1):.3f} against {reference[0]}")
+
+
+# a function that compares the per-interval counts of a result of one ROI with the ground truth, and returns the absolute error of each class(total and per interval)
+def count_errors(result, truth):
+    return {
+        key: {'total': abs(sum(result[key]) - sum(truth[key])), 'intervals': float(np.abs(np.array(result[key]) - np.array(truth[key])).sum())} for key in SELECTED_CLASSES
+    }
+
+# end-to-end benchmark: synthetic videos with known crossings, processed by server.calculate and by the socket server with the stub detector, checked against the ground truth and saved as JSON
+# the run fails(exit status 1) when the counts are not exactly the ground truth
+def bench_e2e(args):
+    import server # imported here, so that the other benchmarks don't need the server
+    directory = tempfile.mkdtemp()
+    counter_module.ASSETS_DIR = directory + os.sep # the server finds the synthetic videos by name
+    server.MODELS['stub'] = ('stub', None)
+    rois, truths = [], []
+    for i in range(args.videos): # one video for each seed, with a vertical line in the middle of the frame
+        objects = synthetic_scene(args.frames, args.objects, args.width, args.height, seed=i, separate=True)
+        synthetic_video(os.path.join(directory, f"synthetic{i}.mp4"), args.frames, objects, args.width, args.height)
+        crossings = scene_crossings(objects, args.frames, args.width / 2)
+        truths.append(count_class_intervals({key: crossings.get(class_id, []) for key, class_id in SELECTED_CLASSES.items()}, interval_edges(args.frames, args.intervals)))
+        rois.append({'start': (args.width // 2, 0), 'end': (args.width // 2, args.height), 'color': 'blue', 'video': f'synthetic{i}', 'intervals': args.intervals, 'model': 'stub', 'stats': True})
+    report = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'config': {key: value for key, value in vars(args).items() if key != 'func'},
+    }
+    try:
+        pool = server.ModelPool(args.workers) # the stub detectors are loaded when the jobs ask for them
+        detector = pool.acquire('stub', server.IMGSZ)
+        name = detector.name
+        pool.release(detector)
+        runs = {'cold': [], 'cached': [], 'stored': []}
+        errors = []
+        for run in range(args.runs): # each cold run starts with an empty detection cache and result store, the next run uses the detection cache and the last one the result store
+            shutil.rmtree(os.path.join(directory, 'cache'), ignore_errors=True)
+            server.detection_caches[name] = DetectionCache(name, os.path.join(directory, 'cache'))
+            for phase in runs:
+                if phase != 'stored':
+                    server.result_store = ResultStore(os.path.join(directory, 'cache', f'{phase}.sqlite3')) # an empty store
+                start = time.perf_counter()
+                results = server.calculate(rois, pool)
+                runs[phase].append(time.perf_counter() - start)
+                assert not isinstance(results, dict), results.get('error')
+                errors.append([count_errors(result, truth) for result, truth in zip(results, truths)])
+        moved = [dict(roi, start=(roi['start'][0] + 2, roi['start'][1]), end=(roi['end'][0] - 2, roi['end'][1])) for roi in rois] # the lines re-drawn a few pixels away
+        start = time.perf_counter()
+        fuzzy = server.calculate(moved, pool)
+        runs['fuzzy'] = [time.perf_counter() - start]
+        report['stats'] = results[0]['stats'] # the stages of the last stored run
+        report['calculate'] = {
+            phase: {'p50_s': float(np.percentile(times, 50)), 'max_s': float(max(times)), 'fps': args.videos * args.frames / float(np.median(times))} for phase, times in runs.items()
+        }
+        report['calculate']['fuzzy']['same_counts'] = all(result[key] == expected[key] for result, expected in zip(fuzzy, results) for key in SELECTED_CLASSES) # answered from the store
+        report['accuracy'] = {
+            'total_error': int(sum(error[key]['total'] for error in errors[-1] for key in error)),
+            'interval_error': int(sum(error[key]['intervals'] for error in errors[-1] for key in error)),
+            'crossings': int(sum(sum(truth[key]) for truth in truths for key in truth)),
+            'deterministic': all(run == errors[0] for run in errors), # every run gives the same counts
+        }
+        for phase, result in report['calculate'].items():
+            print(f"calculate {phase:6}: p50 {result['p50_s']:.2f} s, {result['fps']:.0f} fps over {args.videos} videos of {args.frames} frames")
+        print(f"lines moved by 2 px answered from the store with the same counts: {report['calculate']['fuzzy']['same_counts']}")
+        print(f"accuracy: {report['accuracy']['total_error']} missed or extra of {report['accuracy']['crossings']} crossings, {report['accuracy']['interval_error']} in the wrong interval, deterministic: {report['accuracy']['deterministic']}")
+
+        shutil.rmtree(os.path.join(directory, 'cache'), ignore_errors=True)
+        server.detection_caches[name] = DetectionCache(name, os.path.join(directory, 'cache')) # the server starts with an empty cache and store too
+        server.result_store = ResultStore(os.path.join(directory, 'cache', 'server.sqlite3'))
+        ready = threading.Event() # the socket server with the real calculate function and the stub detector
+        threading.Thread(target=server.serve, args=('127.0.0.1', args.port, args.workers, args.clients, pool, server.calculate, ready), daemon=True).start()
+        ready.wait()
+        def client(i): # send the request of one video and measure the time until the results
+            start = time.perf_counter()
+            with socket.create_connection(('127.0.0.1', args.port)) as s:
+                protocol.send_message(s, protocol.REQUEST, [rois[i % len(rois)]])
+                message_type, message, _ = protocol.recv_message(s)
+                while message_type in (protocol.ACCEPTED, protocol.PROGRESS):
+                    message_type, message, _ = protocol.recv_message(s)
+            return message_type, message, time.perf_counter() - start
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            responses = list(pool.map(client, range(args.clients)))
+        elapsed = time.perf_counter() - start
+        latency = np.array([response[2] for response in responses if response[0] == protocol.RESULT])
+        correct = sum(response[0] == protocol.RESULT and all(response[1][0][key] == results[i % len(rois)][key] for key in SELECTED_CLASSES) for i, response in enumerate(responses)) # same counts as calculate
+        report['server'] = {
+            'clients': args.clients,
+            'done': len(latency),
+            'same_counts': int(correct),
+            'p50_s': float(np.percentile(latency, 50)) if len(latency) else None,
+            'p95_s': float(np.percentile(latency, 95)) if len(latency) else None,
+            'jobs_per_s': len(latency) / elapsed,
+        }
+        print(f"server: {len(latency)}/{args.clients} done, {correct} with the same counts as calculate, {report['server']['jobs_per_s']:.2f} jobs/s")
+        if len(latency):
+            print(f"server latency: p50 {report['server']['p50_s']:.2f} s, p95 {report['server']['p95_s']:.2f} s")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"results saved to {args.output}")
+    accuracy = report['accuracy']
+    if accuracy['total_error'] or accuracy['interval_error'] or not accuracy['deterministic']: # every crossing of the scenes can be tracked, so any error is a bug of the engine
+        raise SystemExit(f"e2e failed: {accuracy['total_error']} missed or extra crossings, {accuracy['interval_error']} in the wrong interval, deterministic: {accuracy['deterministic']}")
+
+
+# measure how the per-frame cost of the line set and the polygon set grows from 1 to 100 zones, against one sv.LineZone and one sv.PolygonZone for each zone(the results are tested in tests/test_zones.py)
+# the construction of the zones is timed apart from the per-frame cost, since it is done once for each job
+def bench_zones(args):
+    frames = synthetic_detections(args.frames, args.objects)
+    counter = Counter([], 'synthetic')
+    tracked = [
+        counter.update(sv.Detections(xyxy=xyxy.copy(), confidence=confidence.copy(), class_id=class_id.copy()), index) for index, (xyxy, confidence, class_id) in enumerate(frames)
+    ] # the tracked detections of each frame, the same for every number of zones
+    report = []
+    for num_zones in args.zones:
+        lines, polygons = random_zones(num_zones)
+        begin = time.perf_counter()
+        line_zones = [sv.LineZone(start=sv.Point(*start), end=sv.Point(*end)) for start, end in lines]
+        line_loop_build = time.perf_counter() - begin
+        begin = time.perf_counter()
+        expected = []
+        for detections in tracked: # one sv.LineZone for each line
+            expected.append(np.array([np.logical_or(*line_zone.trigger(detections)) for line_zone in line_zones]).reshape(num_zones, len(detections)))
+        line_loop = (time.perf_counter() - begin) / len(tracked)
+        begin = time.perf_counter()
+        line_set = LineSet(lines)
+        line_set_build = time.perf_counter() - begin
+        begin = time.perf_counter()
+        crossed = [line_set.trigger(detections.tracker_id, detections.xyxy) for detections in tracked] # all the lines at once
+        line_vectorized = (time.perf_counter() - begin) / len(tracked)
+        same = all(np.array_equal(a, b) for a, b in zip(crossed, expected)) # tested in tests/test_zones.py, only reported here
+        begin = time.perf_counter()
+        polygon_zones = [sv.PolygonZone(polygon=np.array(polygon), triggering_anchors=(sv.Position.BOTTOM_CENTER,)) for polygon in polygons]
+        polygon_loop_build = time.perf_counter() - begin
+        begin = time.perf_counter()
+        expected = [np.array([polygon_zone.trigger(detections) for polygon_zone in polygon_zones]).reshape(num_zones, len(detections)) for detections in tracked] # one mask for each polygon
+        polygon_loop = (time.perf_counter() - begin) / len(tracked)
+        begin = time.perf_counter()
+        polygon_set = PolygonSet(polygons)
+        polygon_set_build = time.perf_counter() - begin
+        begin = time.perf_counter()
+        inside = [polygon_set.trigger(detections.xyxy) for detections in tracked] # one lookup in the packed masks
+        polygon_vectorized = (time.perf_counter() - begin) / len(tracked)
+        same = same and all(np.array_equal(a, b) for a, b in zip(inside, expected))
+        zones_counter = Counter([{'start': start, 'end': end} for start, end in lines] + [{'type': 'polygon', 'points': polygon} for polygon in polygons], 'synthetic')
+        for index, (xyxy, confidence, class_id) in enumerate(frames): # the whole update with all the lines and polygons in one frame pass
+            zones_counter.update(sv.Detections(xyxy=xyxy.copy(), confidence=confidence.copy(), class_id=class_id.copy()), index)
+        stats = zones_counter.stats()
+        print(f"{num_zones} zones: same results as the per-zone loops: {same}")
+        print(f"{num_zones} zones: construction of LineZones {line_loop_build * 1000:.2f} ms, line set {line_set_build * 1000:.2f} ms, PolygonZones {polygon_loop_build * 1000:.2f} ms, polygon set {polygon_set_build * 1000:.2f} ms")
+        report.append((num_zones, line_loop, line_vectorized, polygon_loop, polygon_vectorized, stats['zones']['total_ms'] / len(frames), stats['track']['total_ms'] / len(frames)))
+    print(f"frames: {args.frames}, objects: {args.objects}")
+    print("zones | LineZone loop | line set | PolygonZone loop | polygon set | Counter zones stage | Counter track stage (ms/frame, without the construction)")
+    for num_zones, line_loop, line_vectorized, polygon_loop, polygon_vectorized, zones_ms, track_ms in report:
+        print(f"{num_zones:5d} | {line_loop * 1000:13.3f} | {line_vectorized * 1000:8.3f} | {polygon_loop * 1000:16.3f} | {polygon_vectorized * 1000:11.3f} | {zones_ms:19.3f} | {track_ms:19.3f}")
+    first, last = report[0], report[-1]
+    print(f"{first[0]} --> {last[0]} zones: LineZone loop x{last[1] / first[1]:.1f}, line set x{last[2] / first[2]:.1f}, PolygonZone loop x{last[3] / first[3]:.1f}, polygon set x{last[4] / first[4]:.1f}")
+
+
+parser = argparse.ArgumentParser()
+subparsers = parser.add_subparsers(dest="benchmark", required=True)
+frame_parser = subparsers.add_parser("frame", help="per-frame overhead of the counting path with synthetic detections")
+frame_parser.add_argument("--frames", type=int, default=1000, help="number of frames")
+frame_parser.add_argument("--objects", type=int, default=200, help="number of objects that cross the line")
+frame_parser.set_defaults(func=bench_frame)
+batch_parser = subparsers.add_parser("batch", help="frames per second of Counter.process for several batch sizes")
+batch_parser.add_argument("--frames", type=int, default=300, help="number of frames of the synthetic video")
+batch_parser.add_argument("--objects", type=int, default=60, help="number of objects that cross the line")
+batch_parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="batch sizes to compare")
+batch_parser.add_argument("--queue-size", type=int, default=64, help="number of decoded frames that can wait for the model")
+batch_parser.add_argument("--latency", type=float, default=5.0, help="fixed latency of one call to the stub detector in ms")
+batch_parser.add_argument("--model", help="path to a small YOLO model(e.g. yolov8n.pt) to use instead of the stub detector")
+batch_parser.set_defaults(func=bench_batch)
+server_parser = subparsers.add_parser("server", help="latency and throughput of the socket server with many simulated clients")
+server_parser.add_argument("--clients", type=int, default=32, help="number of simulated clients")
+server_parser.add_argument("--workers", type=int, default=2, help="number of model workers")
+server_parser.add_argument("--queue-size", type=int, default=16, help="number of jobs that can wait for a worker")
+server_parser.add_argument("--job-time", type=float, default=200.0, help="time of one job in ms")
+server_parser.add_argument("--port", type=int, default=4100, help="port of the server")
+server_parser.set_defaults(func=bench_server)
+protocol_parser = subparsers.add_parser("protocol", help="loopback throughput of the wire protocol with multi-megabyte messages")
+protocol_parser.add_argument("--intervals", type=int, default=100000, help="number of intervals of each class in the message")
+protocol_parser.set_defaults(func=bench_protocol)
+tracks_parser = subparsers.add_parser("tracks", help="time of the TrackStore crossings against sv.LineZone replayed on recorded tracks")
+tracks_parser.add_argument("--frames", type=int, default=1000, help="number of frames")
+tracks_parser.add_argument("--objects", type=int, default=200, help="number of objects that cross the line")
+tracks_parser.add_argument("--lines", type=int, default=20, help="number of random new lines to check")
+tracks_parser.set_defaults(func=bench_tracks)
+intervals_parser = subparsers.add_parser("intervals", help="time of the vectorized interval counting against the legacy function")
+intervals_parser.add_argument("--crossings", type=int, default=100000, help="number of crossings of each class")
+intervals_parser.add_argument("--frames", type=int, default=100000, help="number of frames of the video")
+intervals_parser.add_argument("--intervals", type=int, default=60, help="number of intervals")
+intervals_parser.set_defaults(func=bench_intervals)
+stride_parser = subparsers.add_parser("stride", help="counts and time of the frame stride and the motion gate against full-rate processing")
+stride_parser.add_argument("--frames", type=int, default=1800, help="number of frames of the synthetic video")
+stride_parser.add_argument("--objects", type=int, default=60, help="number of objects that cross the line")
+stride_parser.add_argument("--active-fraction", type=float, default=0.3, help="fraction of every 300 frames in which objects appear")
+stride_parser.add_argument("--width", type=int, default=1280, help="width of the synthetic video")
+stride_parser.add_argument("--height", type=int, default=720, help="height of the synthetic video")
+stride_parser.set_defaults(func=bench_stride)
+crop_parser = subparsers.add_parser("crop", help="time and counts of the crop inference around the line against full-frame inference on 4K input")
+crop_parser.add_argument("--frames", type=int, default=300, help="number of frames of the synthetic video")
+crop_parser.add_argument("--objects", type=int, default=40, help="number of objects that cross the line")
+crop_parser.add_argument("--padding", type=int, default=400, help="padding of the crop region in pixels")
+crop_parser.add_argument("--tile-size", type=int, default=640, help="size of the tiles of the crop region")
+crop_parser.add_argument("--width", type=int, default=3840, help="width of the synthetic video")
+crop_parser.add_argument("--height", type=int, default=2160, help="height of the synthetic video")
+crop_parser.set_defaults(func=bench_crop)
+chunks_parser = subparsers.add_parser("chunks", help="speedup of chunked processing against sequential processing")
+chunks_parser.add_argument("--frames", type=int, default=1800, help="number of frames of the synthetic video")
+chunks_parser.add_argument("--objects", type=int, default=80, help="number of objects that cross the line")
+chunks_parser.add_argument("--processes", type=int, nargs="+", default=[2, 4], help="numbers of worker processes to compare")
+chunks_parser.add_argument("--overlap", type=int, default=150, help="number of frames before each chunk used to warm up the tracker")
+chunks_parser.add_argument("--intervals", type=int, default=12, help="number of intervals of the counts")
+chunks_parser.add_argument("--width", type=int, default=1280, help="width of the synthetic video")
+chunks_parser.add_argument("--height", type=int, default=720, help="height of the synthetic video")
+chunks_parser.set_defaults(func=bench_chunks)
+backends_parser = subparsers.add_parser("backends", help="ms/frame and precision/recall of detector backends against a reference backend on the same clip")
+backends_parser.add_argument("--backends", nargs="+", default=["stub"], help="detectors to compare, as backend[:path[:imgsz]](e.g. onnx:models/yolov8n.onnx:640)")
+backends_parser.add_argument("--reference", default="stub", help="reference detector, as backend[:path[:imgsz]](e.g. ultralytics:models/yolov8n.pt)")
+backends_parser.add_argument("--video", help="clip to run the detectors on(a synthetic clip if not given)")
+backends_parser.add_argument("--frames", type=int, default=120, help="number of frames of the clip")
+backends_parser.add_argument("--objects", type=int, default=40, help="number of objects of the synthetic clip")
+backends_parser.add_argument("--batch-size", type=int, default=8, help="number of frames of each call to the detector")
+backends_parser.add_argument("--iou", type=float, default=0.5, help="minimum IoU of a detection that matches a reference detection")
+backends_parser.add_argument("--width", type=int, default=1280, help="width of the synthetic clip")
+backends_parser.add_argument("--height", type=int, default=720, help="height of the synthetic clip")
+backends_parser.set_defaults(func=bench_backends)
+e2e_parser = subparsers.add_parser("e2e", help="end-to-end throughput, latency and count accuracy of calculate and the socket server on synthetic videos with known crossings")
+e2e_parser.add_argument("--videos", type=int, default=2, help="number of synthetic videos")
+e2e_parser.add_argument("--frames", type=int, default=600, help="number of frames of each video")
+e2e_parser.add_argument("--objects", type=int, default=30, help="number of objects of each video")
+e2e_parser.add_argument("--intervals", type=int, default=6, help="number of intervals of the counts")
+e2e_parser.add_argument("--runs", type=int, default=3, help="number of cold(and cached) runs of calculate")
+e2e_parser.add_argument("--clients", type=int, default=4, help="number of simulated clients of the socket server")
+e2e_parser.add_argument("--workers", type=int, default=2, help="number of workers of the socket server")
+e2e_parser.add_argument("--port", type=int, default=4200, help="port of the socket server")
+e2e_parser.add_argument("--width", type=int, default=1280, help="width of the synthetic videos")
+e2e_parser.add_argument("--height", type=int, default=720, help="height of the synthetic videos")
+e2e_parser.add_argument("--output", default=time.strftime("benchmarks/e2e-%Y%m%d-%H%M%S.json"), help="JSON file of the results, to compare the runs over time")
+e2e_parser.set_defaults(func=bench_e2e)
+zones_parser = subparsers.add_parser("zones", help="per-frame cost of the vectorized lines and polygons against the per-zone loops from 1 to 100 zones")
+zones_parser.add_argument("--frames", type=int, default=300, help="number of synthetic frames")
+zones_parser.add_argument("--objects", type=int, default=60, help="number of synthetic objects")
+zones_parser.add_argument("--zones", type=int, nargs="+", default=[1, 10, 50, 100], help="numbers of lines and of polygons to measure")
+zones_parser.set_defaults(func=bench_zones)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    args.func(args)
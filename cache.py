@@ -0,0 +1,121 @@
+# Description: This module contains the on-disk cache of the detections of each video. The detections don't depend on the ROIs, so when the user re-draws the lines of a video only the tracking and the line crossing have to run again.
+
+# Import necessary libraries
+import hashlib
+import os
+import shutil
+import threading
+import numpy as np
+import supervision as sv
+from tracks import TrackStore
+
+# Define the cache settings
+CACHE_DIR = 'cache' # directory of the cache, each entry is a sub directory
+CACHE_SIZE = 10 * 1024 ** 3 # maximum size of the cache in bytes, the least recently used entries are evicted above this size
+TRACK_COLUMNS = ('tracker_id', 'frame', 'class_id', 'xyxy') # the columns of the TrackStore, stored next to the detections
+
+cache_lock = threading.Lock() # the workers share the cache directory, even with the caches of different detectors
+video_hashes = {} # (path, size, modification time) --> content hash, so that a video is hashed only once while it doesn't change
+
+# a function that returns the hash of the content of a video file
+def video_hash(path):
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    if key not in video_hashes:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        video_hashes[key] = digest.hexdigest()
+    return video_hashes[key]
+
+# a class that gives the cached detections of each frame, read from memory mapped columns
+class CachedDetections:
+    def __init__(self, directory:str):
+        self.offsets = np.load(os.path.join(directory, 'offsets.npy')) # the detections of frame i are the rows offsets[i]:offsets[i + 1] of the columns
+        self.xyxy = np.load(os.path.join(directory, 'xyxy.npy'), mmap_mode='r')
+        self.confidence = np.load(os.path.join(directory, 'confidence.npy'), mmap_mode='r')
+        self.class_id = np.load(os.path.join(directory, 'class_id.npy'), mmap_mode='r')
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index:int) -> sv.Detections:
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return sv.Detections(
+            xyxy=np.array(self.xyxy[start:end]),
+            confidence=np.array(self.confidence[start:end]),
+            class_id=np.array(self.class_id[start:end])
+        ) # copy the rows of the frame, so that the tracking can change them
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+# a class that stores the detections of each frame of a video in a compact columnar format, one entry for each (video content, detector) pair
+class DetectionCache:
+    def __init__(self, model_name:str, directory:str=CACHE_DIR, max_size:int=CACHE_SIZE):
+        self.model_name = model_name # the detections depend on the model, so the model is part of the key
+        self.directory = directory
+        self.max_size = max_size
+        self.lock = cache_lock
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, video_file:str): # the key of the entry of a video
+        return hashlib.sha256((video_hash(video_file) + self.model_name).encode()).hexdigest()
+
+    def load(self, video_file:str): # return the cached detections of the video, or None if they are not cached
+        path = os.path.join(self.directory, self.key(video_file))
+        with self.lock:
+            if not os.path.isdir(path):
+                return None
+            os.utime(path) # mark the entry as recently used
+        return CachedDetections(path)
+
+    def save(self, video_file:str, detections:list): # store the detections of each frame of the video
+        path = os.path.join(self.directory, self.key(video_file))
+        temp_path = path + f'.{os.getpid()}.{threading.get_ident()}.tmp'
+        os.makedirs(temp_path)
+        offsets = np.zeros(len(detections) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(d) for d in detections])
+        np.save(os.path.join(temp_path, 'offsets.npy'), offsets)
+        np.save(os.path.join(temp_path, 'xyxy.npy'), np.concatenate([d.xyxy for d in detections] + [np.empty((0, 4))]).astype(np.float32))
+        np.save(os.path.join(temp_path, 'confidence.npy'), np.concatenate([d.confidence for d in detections] + [np.empty(0)]).astype(np.float32))
+        np.save(os.path.join(temp_path, 'class_id.npy'), np.concatenate([d.class_id for d in detections] + [np.empty(0)]).astype(np.int32)) # int32, so that the class offset of the tracker never overflows
+        with self.lock:
+            try:
+                os.rename(temp_path, path) # the entry appears only when it is complete
+            except OSError: # another worker has already stored the same video
+                shutil.rmtree(temp_path)
+            self.evict()
+
+    def save_tracks(self, video_file:str, tracks: TrackStore): # store the tracks of the video next to its detections(the tracker settings are fixed, so the tracks depend only on the detections)
+        path = os.path.join(self.directory, self.key(video_file))
+        if not os.path.isdir(path): # the detections are not cached(or were evicted)
+            return
+        for name, column in zip(TRACK_COLUMNS, tracks.columns()):
+            temp_path = os.path.join(path, f'tracks_{name}.{os.getpid()}.{threading.get_ident()}.tmp.npy')
+            np.save(temp_path, column)
+            os.replace(temp_path, os.path.join(path, f'tracks_{name}.npy')) # the xyxy column is written last, so the tracks are loaded only when they are complete
+
+    def load_tracks(self, video_file:str): # return the cached tracks of the video, or None if they are not cached
+        path = os.path.join(self.directory, self.key(video_file))
+        files = [os.path.join(path, f'tracks_{name}.npy') for name in TRACK_COLUMNS]
+        if not all(os.path.exists(file) for file in files):
+            return None
+        return TrackStore(*[np.load(file, mmap_mode='r') for file in files])
+
+    def evict(self): # remove the least recently used entries until the cache is smaller than max_size
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.tmp') or not os.path.isdir(path):
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(path))
+            entries.append((os.stat(path).st_mtime, size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            shutil.rmtree(path)
+            total -= size
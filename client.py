@@ -1,20 +1,47 @@
 # Description: This script is used to select multiple ROIs in a video file and send the ROI coordinates to the remote server.
-# Usage: python client.py --video <video_file_name>
+# Usage: python client.py --video <video_file_name> [--zones <JSON file of more lines and polygons>]
+# Drag the mouse to draw a line, press "p" to start a polygon(each click adds a point) and "p" again to close it, double click the button of a roi to remove it
 
 # Import necessary libraries
 import cv2
-import json
 import socket
 import sys
 import argparse
+import json
 from pathlib import Path
 import numpy as np
 import matplotlib.pyplot as plt
+import protocol
 
 
 parser = argparse.ArgumentParser()
 parser.add_argument("--video", help="Path to the video file", default="test")
+parser.add_argument("--intervals", type=int, default=6, help="Number of intervals of the graphs")
+parser.add_argument("--stride", type=int, default=1, help="Process every stride frames of the video(faster, but fast objects may be missed)")
+parser.add_argument("--motion-gate", action="store_true", help="Skip the detector on the frames where nothing moves")
+parser.add_argument("--crop", action="store_true", help="Run the detector only on the region around the lines")
+parser.add_argument("--interval-seconds", type=float, help="Length of the intervals of the graphs in seconds(instead of --intervals)")
+parser.add_argument("--stats", action="store_true", help="Print the time of each processing stage of the job")
+parser.add_argument("--zones", help="JSON file with a list of more zones to count, each one {\"type\": \"line\" or \"polygon\", \"points\": [[x, y], ...], \"name\": optional}")
+parser.add_argument("--health", action="store_true", help="Only ask the server if its models are loaded, and exit")
+parser.add_argument("--msgpack", action="store_true", help="Send the request in msgpack instead of JSON(smaller and faster for many intervals, msgpack must be installed on the client and on the server)")
 args = parser.parse_args() # Parse the arguments
+if args.msgpack and protocol.msgpack is None:
+    parser.error("--msgpack needs the msgpack package, install msgpack")
+encoding = protocol.MSGPACK if args.msgpack else protocol.DEFAULT_ENCODING
+
+# Send ROI coordinates to the remote server
+host = '10.9.8.3' # IP address of the remote server
+port = 4000 # port number must be the same as the server
+
+if args.health: # the server answers right away, even while it is loading the models
+    with socket.create_connection((host, port)) as s:
+        protocol.send_message(s, protocol.HEALTH, {})
+        _, health, _ = protocol.recv_message(s)
+    print(f"Ready: {health['ready']}, up for {health['uptime_s']:.1f} s, {health['queue']}/{health['queue_size']} jobs waiting" + (f", error: {health['error']}" if health['error'] else ""))
+    for model in health['models']:
+        print(f"{model['spec']}: {model['loaded']} loaded, {model['idle']} idle" + (f", load {model['load_s']:.2f} s, warm-up {model['warmup_s']:.2f} s" if 'load_s' in model else ""))
+    sys.exit()
 
 path_str = 'assets\\' + args.video + '.mp4' # string that contains path to the video file(video file must be in ./assets folder)
 
@@ -45,48 +72,64 @@ ret, frame = cap.read()
 frame = cv2.rectangle(frame, (frame.shape[1]-110, 5), (frame.shape[1]-5, 35), (0, 0, 0), -1)
 frame = cv2.putText(frame, "Finish", (frame.shape[1]-100, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2, cv2.LINE_AA)
 
+# Colors of the ROIs in BGR, the names are matplotlib colors so that the graphs use the same colors(cycled if there are more ROIs than colors)
+PALETTE = {'blue':(255, 0, 0), 'green':(0, 255, 0), 'red':(0, 0, 255), 'orange':(0, 165, 255), 'purple':(128, 0, 128), 'cyan':(255, 255, 0), 'magenta':(255, 0, 255), 'yellow':(0, 255, 255), 'brown':(42, 42, 165), 'pink':(203, 192, 255), 'gray':(128, 128, 128), 'olive':(0, 128, 128)}
+BUTTON_HEIGHT = 25 # height of the button of each roi on the top left corner
+
 # Global variables used to select multiple ROIs
 x0, y0 = -1, -1
-rois = {'blue':[], 'green':[], 'red':[]}
+rois = [] # the selected rois, each one a dictionary with the type("line" or "polygon"), the points, the color and the name
+roi_number = 0 # the number of rois added so far, used to name the rois
 selecting_roi = False
+polygon = None # the points of the polygon being drawn(press "p" to start a polygon and "p" again to close it), None while drawing lines
 current_roi = []
-color = (255, 0, 0)
 current_frame = frame.copy()
 running = True
 
+# function that returns the name of the color of the next roi, the least used color of the palette
+def next_color(rois):
+    used = [roi['color'] for roi in rois]
+    return min(PALETTE, key=lambda name: used.count(name)) # the first color of the palette among the least used ones
+
+# function to add a roi with the next color
+def add_roi(kind, points, name=None):
+    global roi_number
+    roi_number += 1
+    color = next_color(rois)
+    rois.append({'type': kind, 'points': points, 'color': color, 'name': name or f"{color}-{roi_number}"})
+
 # function to draw colored rois
 def draw_rois(img, rois):
-    for color, roi in rois.items():
-        if color == 'blue':
-            color = (255, 0, 0)
-        elif color == 'green':
-            color = (0, 255, 0)
-        elif color == 'red':
-            color = (0, 0, 255) # set the color
-        if roi:
-            img = cv2.line(img, roi[0], roi[1], color, 2) # draw the line according to the roi coordinates with the appropriate color
+    for roi in rois:
+        color = PALETTE[roi['color']]
+        if roi['type'] == 'polygon':
+            img = cv2.polylines(img, [np.array(roi['points'], dtype=np.int32)], True, color, 2) # draw the closed polygon with the appropriate color
+        else:
+            img = cv2.line(img, roi['points'][0], roi['points'][1], color, 2) # draw the line according to the roi coordinates with the appropriate color
     return img
 
-# function to draw small colored rectangles as buttons on the top left corner according to the color of the roi
+# function to draw small colored rectangles as buttons on the top left corner, one for each roi(double click a button to remove its roi)
 def draw_buttons(img, rois):
-    for color, roi in rois.items():
-        if not roi:
-            continue
-        if color == 'blue':
-            color = (255, 0, 0)
-            img = cv2.rectangle(img, (10, 10), (60, 30), color, -1)
-        elif color == 'green':
-            color = (0, 255, 0)
-            img = cv2.rectangle(img, (10, 60), (60, 80), color, -1)
-        elif color == 'red':
-            color = (0, 0, 255)
-            img = cv2.rectangle(img, (10, 110), (60, 130), color, -1)
+    for i, roi in enumerate(rois):
+        img = cv2.rectangle(img, (10, 10 + i * BUTTON_HEIGHT), (60, 5 + (i + 1) * BUTTON_HEIGHT), PALETTE[roi['color']], -1)
     return img
 
+# function to draw the rois and the buttons on the first frame and display it
+def redraw():
+    global current_frame
+    current_frame = draw_buttons(draw_rois(frame.copy(), rois), rois)
+    cv2.imshow('Select ROIs', current_frame)
+
 # mouse event handler to select multiple rois & input button clicks(the function's name is legacy)
 def select_roi(event, x, y, flags, param):
-    global selecting_roi, current_roi, x0, y0, color, current_frame, rois, running # declare global variables
-    if event == cv2.EVENT_LBUTTONDOWN: # if the left mouse button is clicked, start selecting roi
+    global selecting_roi, current_roi, x0, y0, running # declare global variables
+    color = PALETTE[next_color(rois)] # the color of the roi being drawn
+    if event == cv2.EVENT_LBUTTONDOWN and polygon is not None: # while drawing a polygon, each click adds a point
+        polygon.append((x, y))
+        frame_copy = current_frame.copy()
+        cv2.polylines(frame_copy, [np.array(polygon, dtype=np.int32)], False, color, 2)
+        cv2.imshow('Select ROIs', frame_copy)
+    elif event == cv2.EVENT_LBUTTONDOWN: # if the left mouse button is clicked, start selecting roi
         selecting_roi = True
         current_roi = [(x, y)]
         x0,y0=x,y
@@ -94,62 +137,20 @@ def select_roi(event, x, y, flags, param):
         frame_copy = current_frame.copy()
         cv2.line(frame_copy, (x0,y0),(x,y),color,2)
         cv2.imshow('Select ROIs', frame_copy)
-    elif event == cv2.EVENT_LBUTTONUP: # when the left mouse button is released, stop selecting roi
+    elif event == cv2.EVENT_LBUTTONUP and selecting_roi: # when the left mouse button is released, stop selecting roi
         selecting_roi = False
         current_roi.append((x, y))
-        if x0 != x and y0 != y: # if the roi is not a point,
-            if color == (255, 0, 0):
-                rois['blue'] = current_roi # if the current color is set to blue, the roi becomes blue
-                current_frame = draw_rois(frame.copy(), rois) # draw the rois on the frame according to the rois
-                current_frame = draw_buttons(current_frame, rois) # draw the buttons on the frame according to the rois
-                if len(rois['green']) == 0: # cycle the colors of the roi so that the next roi will be of a different color
-                    color = (0, 255, 0)
-                elif len(rois['red']) == 0:
-                    color = (0, 0, 255)
-                else:
-                    color = None # if all rois are selected, set the color to None
-            elif color == (0, 255, 0):
-                rois['green'] = current_roi
-                current_frame = draw_rois(frame.copy(), rois)
-                current_frame = draw_buttons(current_frame, rois)
-                if len(rois['blue']) == 0:
-                    color = (255,0, 0)
-                elif len(rois['red']) == 0:
-                    color = (0, 0, 255)
-                else:
-                    color = None
-            elif color == (0, 0, 255):
-                rois['red'] = current_roi
-                current_frame = draw_rois(frame.copy(), rois)
-                current_frame = draw_buttons(current_frame, rois)
-                if len(rois['green']) == 0:
-                    color = (0, 255, 0)
-                elif len(rois['blue']) == 0:
-                    color = (255,0,0)
-                else:
-                    color = None
-            else:
-                print("All ROIs selected.") # if there is no space for more rois(color=None), print a message
-            current_roi = []
-        else:
-            current_roi = []
-        cv2.imshow('Select ROIs', current_frame)
+        if x0 != x and y0 != y: # if the roi is not a point, add it(there is no limit on the number of rois)
+            add_roi('line', current_roi)
+        current_roi = []
+        redraw()
     elif event == cv2.EVENT_LBUTTONDBLCLK:
-        c = 0
-        if 10<x<60 and 10<y<30:
-            c = 'blue' # if the mouse is double clicked on the blue button, set the color to blue
-        elif 10<x<60 and 60<y<80:
-            c = 'green' # if the mouse is double clicked on the green button, set the color to green
-        elif 10<x<60 and 110<y<130:
-            c = 'red' # if the mouse is double clicked on the red button, set the color to red
+        i = (y - 10) // BUTTON_HEIGHT # the button under the mouse
+        if 10<x<60 and y >= 10 and i < len(rois):
+            rois.pop(i) # remove the roi of the button that was double clicked
+            redraw()
         elif frame.shape[1]-110<x<frame.shape[1]-5 and 5<y<35:
             running = False # if the mouse is double clicked on the finish button, stop the while loop
-        if c: # if color is set(button is clicked),
-            rois[c] = [] # reset the roi of the color to an empty list(this will remove the roi of the color from the frame)
-            current_frame = draw_rois(frame.copy(), rois)
-            current_frame = draw_buttons(current_frame, rois)
-            cv2.imshow('Select ROIs', current_frame)
-            color = (255, 0, 0) if c == 'blue' else (0, 255, 0) if c == 'green' else (0, 0, 255) # change the color back to the color of the button that was clicked(the color that was removed)
         
         
 cv2.namedWindow("Select ROIs")
@@ -157,68 +158,101 @@ cv2.imshow("Select ROIs", frame)
 cv2.setMouseCallback("Select ROIs", select_roi)
 
 while running: # wait for the user to select the rois, and stop when the user clicks the finish button
-    cv2.waitKey(1)
+    if cv2.waitKey(1) == ord('p'): # start a polygon, or close the polygon being drawn
+        if polygon is None:
+            polygon = []
+        else:
+            if len(polygon) >= 3:
+                add_roi('polygon', polygon)
+            polygon = None
+            redraw()
 
 cv2.destroyWindow("Select ROIs")
 cap.release()
 
+if args.zones: # add the lines and polygons of the file, e.g. too many zones to draw by hand
+    with open(args.zones) as f:
+        for zone in json.load(f):
+            add_roi(zone.get('type', 'line'), [tuple(point) for point in zone['points']], zone.get('name'))
+
 # Verify ROIs are correctly selected
-if not rois['blue'] and not rois['green'] and not rois['red']:
+if not rois:
     print("No ROIs selected. Exiting.")
     sys.exit()
 
 # Prepare ROIs coordinates
 roi_coordinates = [
-    {"start":roi[0], "end":roi[1], "color":color, "video":args.video} for color, roi in rois.items() if len(roi) == 2 # if the roi is a line, add the roi to the roi_coordinates
+    dict(
+        {"start":roi['points'][0], "end":roi['points'][1]} if roi['type'] == 'line' else {"type":"polygon", "points":roi['points']},
+        color=roi['color'], name=roi['name'], video=args.video, intervals=args.intervals, interval_seconds=args.interval_seconds, stride=args.stride, motion_gate=args.motion_gate, crop=args.crop, stats=args.stats
+    ) for roi in rois
 ]
 
-# Send ROI coordinates to the remote server
-host = '10.9.8.3' # IP address of the remote server
-port = 4000 # port number must be the same as the server
+classes_list = ['person', 'bicycle', 'motorcycle', 'car', 'bus', 'truck']
+
+# function to draw the current counts of each roi while the server is processing the video, returns False if the user pressed ESC to cancel the job
+def draw_progress(progress):
+    plt.cla()
+    plt.clf() # clear the previous graph
+    width = 0.8 / len(progress['counts'])
+    for i, counts in enumerate(progress['counts']):
+        plt.bar(np.arange(len(classes_list)) + i * width, [counts[class_name] for class_name in classes_list], width, color=counts['color']) # one bar for each class and roi
+    plt.xticks(np.arange(len(classes_list)), classes_list)
+    plt.title(f"{progress['frames']}/{progress['total']} frames (ESC to cancel)")
+    plt.savefig('assets\\progress.png')
+    cv2.imshow('Progress', cv2.imread('assets\\progress.png')) # save as image and display with cv2
+    return cv2.waitKey(1) != 27
 
 # Connect to the server
 with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s: # create a socket
     s.connect((host, port)) # connect to the server
-    s.sendall(json.dumps(roi_coordinates).encode()) # send the roi coordinates to the server
+    protocol.send_message(s, protocol.REQUEST, roi_coordinates, encoding) # send the roi coordinates to the server(the server answers in the same encoding)
     print("ROI coordinates sent to the remote server")
 
     # Receive the results from the server
-    data = b''
-    while True:
-        packet = s.recv(4096) # receive data in packets of 4096 bytes(this is enough for the results to be received in one packet)
-        data += packet
-        if packet:
-            break # keep receiving data until I receive a non-empty packet
-
-    results = json.loads(data.decode())
+    message_type, results, _ = protocol.recv_message(s) # the server first answers with the job id and the position in the queue, or with an error if it is busy
+    if message_type == protocol.ACCEPTED:
+        print(f"Job {results['job']} queued at position {results['position']}")
+        message_type, results, _ = protocol.recv_message(s) # wait until the job is processed(the message is received completely, no matter how large it is)
+    while message_type == protocol.PROGRESS: # the server streams the progress of the job before the results
+        print(f"{results['frames']}/{results['total']} frames processed({results['fps']:.1f} fps)")
+        if not draw_progress(results):
+            print("Job cancelled.") # closing the connection stops the job on the server
+            sys.exit()
+        message_type, results, _ = protocol.recv_message(s)
+    cv2.destroyAllWindows()
     print("Results received from the remote server")
     
-    try:
-        if results['error']: # if an error is received, print the error and exit
-            print(f"Error: {results['error']}")
-            sys.exit()
-    except TypeError:
-        pass
+    if message_type == protocol.ERROR: # if an error is received, print the error and exit
+        print(f"Error: {results['error']}")
+        sys.exit()
 
     # Print the results
     for result in results: # print the results for each roi
-        print(f"Total pedestrians entering ROI {result['color']}: {max(np.sum(result['person']) - np.sum(result['bicycle']), 0)}") # pedestrian = person - bicycle
-        print(f"Total cyclists entering ROI {result['color']}: {np.sum(result['bicycle'])}")
-        print(f"Total cars entering ROI {result['color']}: {np.sum(result['car'])}")
-        print(f"Total trucks entering ROI {result['color']}: {np.sum(result['truck'])}")
-        print(f"Total buses entering ROI {result['color']}: {np.sum(result['bus'])}")
-        print(f"Total motorcycles entering ROI {result['color']}: {np.sum(result['motorcycle'])}")
+        print(f"Total pedestrians entering ROI {result['name']}: {max(np.sum(result['person']) - np.sum(result['bicycle']), 0)}") # pedestrian = person - bicycle
+        print(f"Total cyclists entering ROI {result['name']}: {np.sum(result['bicycle'])}")
+        print(f"Total cars entering ROI {result['name']}: {np.sum(result['car'])}")
+        print(f"Total trucks entering ROI {result['name']}: {np.sum(result['truck'])}")
+        print(f"Total buses entering ROI {result['name']}: {np.sum(result['bus'])}")
+        print(f"Total motorcycles entering ROI {result['name']}: {np.sum(result['motorcycle'])}")
+        if 'occupancy' in result: # a polygon also has the mean number of objects inside and the mean time spent inside
+            for class_name in classes_list:
+                print(f"Mean {class_name} inside ROI {result['name']}: {np.mean(result['occupancy'][class_name]):.2f}, mean dwell {result['dwell'][class_name]:.1f} s")
+        if result.get('skipped'):
+            print(f"Frames skipped by the stride and the motion gate: {result['skipped']:.0%}")
         print("\n")
+    if results and results[0].get('stats'): # the stages of the whole job(the same for every roi)
+        for stage, stats in results[0]['stats'].items():
+            print(f"{stage}: {stats['count']} samples, {stats['total_ms']:.0f} ms total, p50 {stats['p50_ms']:.2f} ms, p95 {stats['p95_ms']:.2f} ms")
         
     # draw graph of the results and print the graph
-    classes_list = ['person', 'bicycle', 'motorcycle', 'car', 'bus', 'truck']
-    x = [1,2,3,4,5,6]
     for class_name in classes_list:
         plt.cla()
         plt.clf() # clear the previous graph
         for result in results:
+            x = list(range(1, len(result[class_name]) + 1)) # the number of intervals is set by the request
             if class_name == 'person':
-                plt.plot(x, [max(result['person'][i] - result['bicycle'][i], 0) for i in range(6)], color=result['color']) # pedestrian = person - bicycle
+                plt.plot(x, [max(result['person'][i] - result['bicycle'][i], 0) for i in range(len(x))], color=result['color']) # pedestrian = person - bicycle
             plt.plot(x, result[class_name], color=result['color']) # plot the results of count in each interval as a line graph
         plt.title(f'{class_name} Count')
         plt.savefig('assets\\graph.png')
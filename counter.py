@@ -0,0 +1,569 @@
+# Description: This module contains the counting engine used by the server. It takes the ROIs drawn on a video, runs the detector on every frame and counts the number of objects that crossed each ROI.
+
+# Import necessary libraries
+import cv2
+import multiprocessing
+import numpy as np
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import supervision as sv
+from cache import video_hash
+from detectors import load_detector
+from tracks import TrackStore
+from zones import LineSet, PolygonSet
+
+# COCO class ids of the classes that we are interested in
+SELECTED_CLASSES = {'person':0, 'bicycle':1, 'motorcycle':3, 'car':2, 'bus':5, 'truck':7}
+# offset added to the x coordinates of each class before tracking(larger than any frame width), so that boxes of different classes never overlap and the single tracker never matches them(class-aware tracking)
+CLASS_OFFSET = 10000
+# frame rate the tracker settings are tuned for
+TRACKER_FRAME_RATE = 30
+# padding around the lines of the crop region, as a fraction of the largest side of the frame(used if the request doesn't set it in pixels)
+CROP_PADDING = 0.1
+# number of frames before each chunk that its worker processes to warm up the tracker, when a video is split in chunks
+CHUNK_OVERLAP = 150
+# overlap of the tiles of the crop region, in pixels
+TILE_OVERLAP = 64
+# minimum time between two progress reports in seconds
+PROGRESS_INTERVAL = 1.0
+# folder of the videos of the server, a request asks for a video by its name(without .mp4)
+ASSETS_DIR = '/home/initial/CSP/assets/'
+# colors of the ROIs in BGR, used to draw the ROIs on the annotated video(the same palette as the client)
+ROI_COLORS = {'blue':(255, 0, 0), 'green':(0, 255, 0), 'red':(0, 0, 255), 'orange':(0, 165, 255), 'purple':(128, 0, 128), 'cyan':(255, 255, 0), 'magenta':(255, 0, 255), 'yellow':(0, 255, 255), 'brown':(42, 42, 165), 'pink':(203, 192, 255), 'gray':(128, 128, 128), 'olive':(0, 128, 128)}
+
+# default number of intervals of the graphs, used if the request sets neither the number nor the length of the intervals
+NUM_INTERVALS = 6
+
+# a function that returns the edges of the intervals of a video of max_value frames: num_intervals equal intervals, or intervals of interval_length frames(the last one may end after max_value)
+def interval_edges(max_value, num_intervals=NUM_INTERVALS, interval_length=None):
+    if interval_length:
+        num_intervals = max(int(np.ceil(max_value / interval_length)), 1)
+        return np.arange(num_intervals + 1) * interval_length
+    return np.linspace(0, max_value, num_intervals + 1)
+
+# a function that takes the numbers of each class(a dictionary of lists or arrays) and the edges of the intervals, and counts how many numbers of each class are in each interval with one bincount
+# the intervals are (edges[i], edges[i + 1]], except that the first one also contains edges[0], so that the crossings at the first frame are counted
+# used for printing the graph results of the counter
+# to see how many objects entered the ROI in each interval of the video
+def count_class_intervals(numbers:dict, edges) -> dict:
+    keys = list(numbers)
+    num_intervals = len(edges) - 1
+    values = np.concatenate([np.asarray(numbers[key], dtype=np.float64) for key in keys] + [np.empty(0)])
+    labels = np.repeat(np.arange(len(keys)), [len(numbers[key]) for key in keys]) # the class of each number
+    bins = np.maximum(np.searchsorted(edges, values, side='left') - 1, 0) # the interval of each number
+    valid = (values >= edges[0]) & (values <= edges[-1]) # the numbers outside the intervals are not counted
+    counts = np.bincount(labels[valid] * num_intervals + bins[valid], minlength=len(keys) * num_intervals).reshape(len(keys), num_intervals)
+    return {key: counts[i].astype(float).tolist() for i, key in enumerate(keys)} # a list of counts of numbers in each interval for each class
+
+# a function that takes a list of numbers and a max value and counts how many numbers are in each equally devided intervals of the max value
+def count_intervals(numbers, max_value, num_intervals):
+    return count_class_intervals({0: numbers}, interval_edges(max_value, num_intervals))[0] # a list of counts of numbers in each interval
+    
+# a function that creates the byte tracker for a video processed every stride frames, the frame rate is divided by the stride so that a lost track is kept for the same time(not the same number of processed frames)
+def make_tracker(stride:int=1):
+    return sv.ByteTrack(track_activation_threshold=0.25, lost_track_buffer=30, minimum_matching_threshold=0.7, frame_rate=max(round(TRACKER_FRAME_RATE / stride), 1))
+
+# a function that tells if a ROI is a polygon zone(the ROIs are lines unless their "type" is "polygon")
+def is_polygon(roi:dict) -> bool:
+    return roi.get('type', 'line') == 'polygon'
+
+# a function that returns the points of a ROI: the start and end of a line, or the points of a polygon
+def roi_points(roi:dict) -> list:
+    return roi['points'] if is_polygon(roi) else [roi['start'], roi['end']]
+
+# a function that returns the region(x1, y1, x2, y2) that covers all the lines and polygons of the ROIs with padding pixels around them, clipped to the frame
+def crop_region(rois:list, width:int, height:int, padding:int):
+    points = np.array([point for roi in rois for point in roi_points(roi)])
+    x1, y1 = np.maximum(points.min(axis=0) - padding, 0)
+    x2, y2 = np.minimum(points.max(axis=0) + padding, [width, height])
+    return int(x1), int(y1), int(x2), int(y2)
+
+# a function that splits a region in overlapping tiles of at most tile_size pixels(one tile if tile_size is None or the region is small enough)
+def tile_region(region:tuple, tile_size:int=None, overlap:int=TILE_OVERLAP):
+    x1, y1, x2, y2 = region
+    if not tile_size:
+        return [region]
+    step = max(tile_size - overlap, 1)
+    xs = [x for x in range(x1, max(x2 - overlap, x1 + 1), step)]
+    ys = [y for y in range(y1, max(y2 - overlap, y1 + 1), step)]
+    return [(x, y, min(x + tile_size, x2), min(y + tile_size, y2)) for y in ys for x in xs]
+
+# a class that measures the time of each stage of the processing(decode, detect, track, zones, write...), with one perf_counter call per sample
+# the samples of all the threads of a job are aggregated in percentiles, and can be dumped as a Chrome trace(chrome://tracing)
+class StageTimer:
+    def __init__(self, trace:bool=False):
+        self.samples = {} # stage --> list of durations in seconds
+        self.events = [] if trace else None # (stage, start, duration, thread id) of each sample, only kept for the Chrome trace
+        self.origin = time.perf_counter()
+
+    def add(self, stage:str, start:float): # add a sample of the stage that started at start, and return the current time so that the next stage can start from it
+        now = time.perf_counter()
+        self.samples.setdefault(stage, []).append(now - start)
+        if self.events is not None:
+            self.events.append((stage, start, now - start, threading.get_ident()))
+        return now
+
+    def merge(self, samples:dict): # add the samples of another timer(e.g. of a worker process)
+        for stage, durations in samples.items():
+            self.samples.setdefault(stage, []).extend(durations)
+
+    def summary(self): # the number of samples, the total time and the percentiles of each stage in ms
+        summary = {}
+        for stage, durations in self.samples.items():
+            durations = np.array(durations) * 1000
+            p50, p95, p99 = np.percentile(durations, [50, 95, 99])
+            summary[stage] = {'count': len(durations), 'total_ms': float(durations.sum()), 'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99), 'max_ms': float(durations.max())}
+        return summary
+
+    def trace(self): # the samples in the Chrome trace event format
+        return {'traceEvents': [
+            {'name': stage, 'ph': 'X', 'ts': (start - self.origin) * 1e6, 'dur': duration * 1e6, 'pid': os.getpid(), 'tid': thread} for stage, start, duration, thread in self.events or []
+        ]}
+
+# a class that tells if a frame changed since the last frame that was sent to the model, with a cheap difference of small blurred grayscale frames
+class MotionGate:
+    def __init__(self, threshold:int=25, min_fraction:float=0.002, width:int=160):
+        self.threshold = threshold # minimum difference of a pixel to count as changed
+        self.min_fraction = min_fraction # minimum fraction of changed pixels to count the frame as changed
+        self.width = width # width of the small frames
+        self.reference = None # the small frame of the last frame that was sent to the model
+
+    def __call__(self, frame: np.ndarray) -> bool:
+        height = max(int(frame.shape[0] * self.width / frame.shape[1]), 1)
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        small = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        if self.reference is None or np.count_nonzero(cv2.absdiff(small, self.reference) > self.threshold) > self.min_fraction * small.size:
+            self.reference = small # compare the next frames with this one, so that slow changes add up
+            return True
+        return False
+
+# a class that decodes the frames of a video in a background thread into a bounded queue, so that decoding runs at the same time as the inference
+class FramePrefetcher:
+    def __init__(self, video_file:str, queue_size:int=64, stride:int=1, start:int=0, end:int=None, timer: StageTimer=None):
+        self.video_file = video_file
+        self.timer = timer # measures the decoding time of each frame, if any
+        self.stride = stride # decode every stride frames, the other frames are only grabbed
+        self.start = start # the first frame to decode(the video is seeked to it with CAP_PROP_POS_FRAMES)
+        self.end = end # the frame after the last frame to decode(None = the end of the video)
+        self.queue = queue.Queue(maxsize=queue_size) # bounded, so that at most queue_size decoded frames are kept in memory
+        self.stopped = threading.Event() # set when the consumer stops reading before the end of the video
+        self.error = None # the exception raised in the decoding thread, if any
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def put(self, item): # put an item in the queue, but give up if the consumer has stopped reading
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(self): # the decoding thread: decode the frames until the end of the video, then put None
+        try:
+            frames = sv.get_video_frames_generator(self.video_file, stride=self.stride, start=self.start, end=self.end)
+            start = time.perf_counter()
+            for frame in frames:
+                if self.timer is not None:
+                    self.timer.add('decode', start)
+                if not self.put(frame):
+                    return
+                start = time.perf_counter()
+        except Exception as e:
+            self.error = e
+        self.put(None)
+
+    def __iter__(self): # yield the decoded frames in order
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                break
+            yield frame
+        if self.error is not None:
+            raise self.error
+
+    def close(self): # stop the decoding thread
+        self.stopped.set()
+        self.thread.join()
+
+# a class that annotates the frames and writes the annotated video in a background thread, so that annotation and encoding never run on the inference thread
+class AnnotatedWriter:
+    def __init__(self, target_path:str, video_info: sv.VideoInfo, rois:list, queue_size:int=64, timer: StageTimer=None):
+        self.target_path = target_path
+        self.timer = timer # measures the annotation and encoding time of each frame, if any
+        self.video_info = video_info
+        self.rois = rois
+        self.queue = queue.Queue(maxsize=queue_size) # bounded, so that the memory stays bounded if the writer is slower than the inference
+        self.error = None # the exception raised in the writer thread, if any
+        self.box_annotator = sv.BoxAnnotator()
+        self.label_annotator = sv.LabelAnnotator()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def write(self, frame: np.ndarray, detections: sv.Detections, counts:list): # add a frame with its tracked detections and the current count of each ROI to the queue
+        if self.error is None:
+            self.queue.put((frame, detections, counts)) # blocks only if the writer is a whole queue behind
+
+    def run(self): # the writer thread: annotate and encode the frames in the queue until None is received
+        try:
+            with sv.VideoSink(target_path=self.target_path, video_info=self.video_info) as sink:
+                while True:
+                    item = self.queue.get()
+                    if item is None:
+                        break
+                    start = time.perf_counter()
+                    frame, detections, counts = item
+                    labels = [f"#{tracker_id}" for tracker_id in detections.tracker_id]
+                    frame = self.box_annotator.annotate(scene=frame, detections=detections)
+                    frame = self.label_annotator.annotate(scene=frame, detections=detections, labels=labels)
+                    for roi, count in zip(self.rois, counts): # draw each ROI with its color and its current count
+                        color = ROI_COLORS.get(roi.get('color'), (255, 255, 255))
+                        points = roi_points(roi)
+                        cv2.polylines(frame, [np.array(points, dtype=np.int32)], is_polygon(roi), color, 2)
+                        cv2.putText(frame, str(count), tuple(points[-1]), cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2, cv2.LINE_AA)
+                    sink.write_frame(frame)
+                    if self.timer is not None:
+                        self.timer.add('write', start)
+        except Exception as e:
+            self.error = e
+            while self.queue.get() is not None: # drain the queue so that the inference thread is never blocked
+                pass
+
+    def close(self): # wait until all the frames are written, and raise the error of the writer thread if there was one
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+chunk_pools = {} # (number of processes, detector spec) --> process pool, so that the worker processes and their detectors are created only once
+chunk_detector = None # the detector of this worker process
+chunk_manager = None # the manager process of the cancel events shared with the worker processes
+
+# a function that runs once in each worker process of a chunk pool and loads its own detector from the spec(backend, path, imgsz)
+def init_chunk_worker(spec:tuple):
+    global chunk_detector
+    chunk_detector = load_detector(*spec)
+
+# a function that returns the pool of processes that process the chunks of the videos with the detector of the spec
+def chunk_pool(processes:int, spec:tuple):
+    key = (processes, spec)
+    if key not in chunk_pools:
+        chunk_pools[key] = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'), initializer=init_chunk_worker, initargs=(spec,)) # spawn, so that the models are not shared with the parent process
+    return chunk_pools[key]
+
+# a function that returns a new event that the worker processes check to stop their chunk when the job is cancelled
+def chunk_cancel_event():
+    global chunk_manager
+    if chunk_manager is None:
+        chunk_manager = multiprocessing.get_context('spawn').Manager()
+    return chunk_manager.Event()
+
+# a function that runs in a worker process: it counts the crossings of the frames [start, end) of the video with its own detector, trackers and line zones
+# the frames [start - overlap, start) are processed too so that the tracks that cross the line right after start are already tracked, but their crossings belong to the previous chunk
+def process_chunk(counter_class, rois:list, video:str, video_file:str, tiles, start:int, end:int, overlap:int, options:dict, cancel=None):
+    counter = counter_class(rois, video)
+    counter.cancel = cancel
+    counter.video_file = video_file
+    counter.detector = chunk_detector
+    counter.tiles = tiles
+    if options.get('stride', 1) != 1:
+        counter.byte_tracker = make_tracker(options['stride'])
+    counter.infer(start=max(start - overlap, 0), end=end, **options)
+    frame_counter = [
+        {key: [index for index in frames if index >= start] for key, frames in roi_counter.items()} for roi_counter in counter.frame_counter
+    ] # keep only the crossings of the chunk, the crossings of the overlap are counted by the previous chunk
+    return frame_counter, counter.skipped, end - max(start - overlap, 0), counter.timer.samples
+
+# a class that takes all the ROIs drawn on one video and processes the video once to count the number of objects that crossed each ROI
+class Counter:
+    def __init__(self, rois:list, video_file:str, detector=None, cache=None, progress=None, timer: StageTimer=None, store=None):
+        self.rois = rois # list of ROIs, each one a dictionary with the start and end coordinates of a line, or the points of a polygon("type": "polygon")
+        self.video = video_file # the name of the video, used to create the counters of the chunks in the worker processes
+        self.video_file = video_file
+        self.video_file = ASSETS_DIR + self.video_file + '.mp4'
+        self.detector = detector # the Detector used to detect the objects in each frame(any backend of detectors.py)
+        self.cache = cache # the DetectionCache of the detector, if any
+        self.store = store # the ResultStore of the crossings of each line, if any
+        self.recorded = None # the detections of each frame, recorded while processing to be stored in the cache
+        self.timer = timer if timer is not None else StageTimer() # the time of each stage of the processing, shared by all the counters of a job
+        self.progress = progress # a function called with the progress of the processing(frames processed, fps and current counts), it can raise an exception to stop the processing
+        self.length = 0 # the total number of frames of the video
+        self.reported = (time.perf_counter(), 0) # the time and the number of frames of the last progress report
+        self.last_detections = sv.Detections.empty() # the detections of the last frame that was sent to the model, used for the frames that didn't change
+        self.tiles = None # the tiles of the crop region around the lines, the model only runs on them(None = the whole frame)
+        self.skipped = 0.0 # the fraction of the frames that were not sent to the model(because of the stride or the motion gate)
+        self.cancel = None # an event set when the job is cancelled, checked after each batch(used by the worker processes of the chunks)
+        
+        self.selected_classes = SELECTED_CLASSES
+        self.class_ids = np.array(list(self.selected_classes.values())) # the class ids to keep, used for a single vectorized filter of the detections
+        self.class_names = {class_id: key for key, class_id in self.selected_classes.items()} # class id --> class name, used to split the crossings by class
+        self.byte_tracker = make_tracker() # a single tracker for all classes(shared by all ROIs, since every ROI sees the same detections)
+        self.line_indexes = [i for i, roi in enumerate(self.rois) if not is_polygon(roi)] # the index in rois of each line
+        self.polygon_indexes = [i for i, roi in enumerate(self.rois) if is_polygon(roi)] # the index in rois of each polygon
+        self.lines = LineSet([(self.rois[i]['start'], self.rois[i]['end']) for i in self.line_indexes]) # all the lines, tested at once for each frame
+        self.polygons = PolygonSet([self.rois[i]['points'] for i in self.polygon_indexes]) if self.polygon_indexes else None # all the polygons, tested with one mask lookup for each frame
+        self.frame_counter = [
+            {key: [] for key in self.selected_classes} for roi in self.rois
+        ] # initialize the frame counter for each ROI and class --> it is a list that contains at which frame number an object crossed the line or entered the polygon
+        self.inside = {} # tracker id --> which polygons the track was inside of in its last frame
+        self.occupancy = [{key: [] for key in self.selected_classes} for i in self.polygon_indexes] # the frame number of each object inside each polygon, for each class(one entry for each object and frame)
+        self.dwell = [{} for i in self.polygon_indexes] # tracker id --> [class name, first frame, last frame] of each track inside each polygon
+        self.frames_seen = [] # the frame numbers that were processed, used to turn the occupancy into a mean number of objects
+        self.tracks = TrackStore() # the position of each track in each frame, so that the crossings of any new line can be answered without tracking again(None = don't keep the tracks)
+        
+    def update(self, detections: sv.Detections, index:int): # a function that takes the detections of one frame and the frame number and updates the counters of every ROI
+        start = time.perf_counter()
+        detections = detections[np.isin(detections.class_id, self.class_ids)] # select only the classes that we are interested in
+        detections.xyxy[:, [0, 2]] += detections.class_id[:, None].astype(np.int64) * CLASS_OFFSET # move each class to its own region, so that the tracker is class-aware(int64, the class ids of old caches are int16)
+        detections = self.byte_tracker.update_with_detections(detections) # update the byte tracker with the detections
+        detections.xyxy[:, [0, 2]] -= detections.class_id[:, None].astype(np.int64) * CLASS_OFFSET # move the boxes back to the frame coordinates
+        if self.tracks is not None:
+            self.tracks.append(detections, index)
+        start = self.timer.add('track', start)
+        crossed = self.lines.trigger(detections.tracker_id, detections.xyxy) # every line gets the same tracked detections, all the lines are tested at once
+        for line, j in zip(*np.nonzero(crossed)): # split the crossings by class and append the frame number to the frame counter
+            self.frame_counter[self.line_indexes[line]][self.class_names[detections.class_id[j]]].append(index)
+        if self.polygons is not None:
+            self.update_polygons(detections, index)
+        self.timer.add('zones', start)
+        return detections
+
+    def update_polygons(self, detections: sv.Detections, index:int): # a function that counts the entries, the occupancy and the dwell time of every polygon with the tracked detections of one frame
+        self.frames_seen.append(index)
+        if len(detections) == 0:
+            return
+        inside = self.polygons.trigger(detections.xyxy) # which detection is inside which polygon
+        outside = np.zeros(len(self.polygons), dtype=bool)
+        previous = np.stack([self.inside.get(track, outside) for track in detections.tracker_id], axis=1)
+        entered = inside & ~previous # the track was not inside the polygon in its last frame(or it is a new track)
+        for track, state in zip(detections.tracker_id, inside.T):
+            self.inside[track] = state
+        for zone, j in zip(*np.nonzero(inside)):
+            track, class_name = detections.tracker_id[j], self.class_names[detections.class_id[j]]
+            self.occupancy[zone][class_name].append(index)
+            self.dwell[zone].setdefault(track, [class_name, index, index])[2] = index
+            if entered[zone, j]:
+                self.frame_counter[self.polygon_indexes[zone]][class_name].append(index)
+
+    def forget(self, tracker_ids): # a function that removes the state of the tracks that are gone from the zones
+        self.lines.forget(tracker_ids)
+        for track in tracker_ids:
+            self.inside.pop(track, None)
+
+    def detect(self, frames:list) -> list: # a function that runs the detector on a batch of frames and returns the detections of each frame
+        start = time.perf_counter()
+        self.detector.timer = self.timer # the detector can split its time in stages(e.g. inference and conversion)
+        detections = self.detector.detect(frames)
+        self.timer.add('detect', start)
+        return detections
+
+    def report(self, frames:int, force:bool=False): # a function that reports the progress if PROGRESS_INTERVAL seconds have passed since the last report
+        if self.progress is None:
+            return
+        now = time.perf_counter()
+        if not force and now - self.reported[0] < PROGRESS_INTERVAL:
+            return
+        fps = (frames - self.reported[1]) / max(now - self.reported[0], 1e-6)
+        self.reported = (now, frames)
+        self.progress({
+            'frames': frames,
+            'total': self.length,
+            'fps': fps,
+            'counts': [dict({key: len(frame_counter[key]) for key in frame_counter}, color=roi.get('color'), name=roi.get('name')) for roi, frame_counter in zip(self.rois, self.frame_counter)] # the current count of each ROI and class
+        })
+
+    def detect_tiles(self, frames:list) -> list: # a function that runs the model only on the tiles of the crop region of each frame, and returns the detections in the frame coordinates
+        if self.tiles is None:
+            return self.detect(frames)
+        crops = [np.ascontiguousarray(frame[y1:y2, x1:x2]) for frame in frames for x1, y1, x2, y2 in self.tiles]
+        detected = self.detect(crops)
+        results = []
+        for i in range(len(frames)):
+            parts = detected[i * len(self.tiles):(i + 1) * len(self.tiles)]
+            for detections, (x1, y1, _, _) in zip(parts, self.tiles):
+                detections.xyxy += np.array([x1, y1, x1, y1], dtype=detections.xyxy.dtype) # move the boxes back to the frame coordinates
+            detections = sv.Detections.merge(parts)
+            if len(self.tiles) > 1:
+                detections = detections.with_nms(threshold=0.5) # remove the objects detected twice in the overlap of the tiles
+            results.append(detections)
+        return results
+
+    def process_batch(self, frames:list, indexes:list, writer=None, changed:list=None): # a function that detects a batch of frames and updates the counters in the original frame order(the frames that didn't change reuse the last detections)
+        changed = changed if changed is not None else [True] * len(frames)
+        detected = iter(self.detect_tiles([frame for frame, frame_changed in zip(frames, changed) if frame_changed]) if any(changed) else [])
+        for frame, index, frame_changed in zip(frames, indexes, changed):
+            if frame_changed:
+                self.last_detections = next(detected)
+            detections = self.last_detections
+            if self.recorded is not None:
+                self.recorded.append(detections)
+            detections = self.update(detections, index)
+            if writer is not None:
+                writer.write(frame, detections, [sum(map(len, frame_counter.values())) for frame_counter in self.frame_counter])
+        return sum(changed) # the number of frames sent to the model
+        
+    def count_tracks(self, tracks: TrackStore): # a function that fills the frame counters of the lines from the stored tracks with one query for each line, without tracking again
+        for i in self.line_indexes:
+            frames, class_ids, _ = tracks.crossings(self.rois[i]['start'], self.rois[i]['end'])
+            for key, class_id in self.selected_classes.items():
+                self.frame_counter[i][key] = frames[class_ids == class_id].tolist()
+
+    def infer(self, writer=None, batch_size:int=1, queue_size:int=64, stride:int=1, motion_gate:bool=False, start:int=0, end:int=None): # a function that decodes the frames [start, end) of the video, runs the model on batches of frames and updates the counters(the detections are stored in the cache, if any)
+        full_rate = stride == 1 and not motion_gate and self.tiles is None and start == 0 and end is None # only the detections of every whole frame are stored in the cache
+        self.recorded = [] if self.cache is not None and full_rate else None
+        gate = MotionGate() if motion_gate else None # skip the model on the frames that didn't change
+        frames = FramePrefetcher(self.video_file, queue_size, stride, start, end, self.timer) # decode the frames in the background, no video writer is opened unless annotate is True
+        total = detected = 0
+        try:
+            batch, indexes, changed = [], [], []
+            for frame in frames:
+                batch.append(frame)
+                indexes.append(start + total * stride) # the frame number in the video
+                changed.append(gate(frame) if gate is not None else True)
+                total += 1
+                if len(batch) == batch_size: # run the model on batch_size frames at once(only once, no matter how many ROIs there are)
+                    detected += self.process_batch(batch, indexes, writer, changed)
+                    self.report(indexes[-1] + 1)
+                    if self.cancel is not None and self.cancel.is_set():
+                        raise ConnectionError("job cancelled")
+                    batch, indexes, changed = [], [], []
+            if batch: # the last frames of the video
+                detected += self.process_batch(batch, indexes, writer, changed)
+        finally:
+            frames.close()
+            if writer is not None:
+                writer.close() # always stop the writer thread, even if the inference failed
+        last = min(end, self.length) if end is not None and self.length else end if end is not None else self.length # the frame after the last frame of [start, end) in the video
+        span = max(last - start, (total - 1) * stride + 1 if total else 0) # the frames covered, at least up to the last decoded frame(the frame count of a video can be wrong)
+        self.skipped = 1 - detected / max(span, 1)
+        if self.recorded is not None:
+            self.cache.save(self.video_file, self.recorded) # the next request for the same video doesn't run the model
+            self.recorded = None
+        return full_rate
+
+    def process_chunks(self, length:int, chunks:int, overlap:int, options:dict): # a function that splits the video in chunks, processes each chunk in its own worker process(with the same detector spec) and merges the crossings of the chunks
+        bounds = np.linspace(0, length, chunks + 1).astype(int)
+        pool = chunk_pool(chunks, self.detector.spec)
+        cancel = chunk_cancel_event()
+        futures = [
+            pool.submit(process_chunk, type(self), self.rois, self.video, self.video_file, self.tiles, int(start), int(end), overlap, options, cancel) for start, end in zip(bounds[:-1], bounds[1:]) if end > start
+        ]
+        pending = set(futures)
+        skipped = frames = 0
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED) # wake up at least every PROGRESS_INTERVAL, so that a disconnected client is noticed while the chunks run
+                for future in done:
+                    frame_counter, chunk_skipped, chunk_frames, samples = future.result()
+                    self.timer.merge(samples) # the stages of the worker processes are part of the job
+                    for roi_counter, chunk_counter in zip(self.frame_counter, frame_counter):
+                        for key in roi_counter:
+                            roi_counter[key] += chunk_counter[key]
+                    skipped += chunk_skipped * chunk_frames
+                    frames += chunk_frames
+                self.report(min(frames, length), force=True) # report the counts of the chunks done so far, it raises if the client has disconnected
+        except BaseException:
+            cancel.set() # the running chunks stop after their current batch
+            for future in futures:
+                future.cancel() # don't start the chunks that are still waiting
+            raise
+        self.skipped = skipped / max(frames, 1)
+
+    def replay(self, cached, writer=None, queue_size:int=64): # a function that updates the counters with the cached detections of each frame, the frames are decoded only for the annotated video
+        frames = FramePrefetcher(self.video_file, queue_size, timer=self.timer) if writer is not None else None
+        iter_frames = iter(frames) if frames is not None else None
+        try:
+            for index, detections in enumerate(cached):
+                detections = self.update(detections, index)
+                self.report(index + 1)
+                if writer is not None:
+                    writer.write(next(iter_frames), detections, [sum(map(len, frame_counter.values())) for frame_counter in self.frame_counter])
+        finally:
+            if frames is not None:
+                frames.close()
+            if writer is not None:
+                writer.close()
+
+    def intervals(self, length:int, fps:float): # a function that counts the crossings of each ROI and class in each interval of the video, with the number("intervals") or the length in seconds("interval_seconds") of the intervals asked by the ROI
+        results = []
+        for i, (roi, frame_counter) in enumerate(zip(self.rois, self.frame_counter)):
+            interval_length = roi['interval_seconds'] * fps if roi.get('interval_seconds') else None
+            edges = interval_edges(length, roi.get('intervals') or NUM_INTERVALS, interval_length)
+            result = count_class_intervals(frame_counter, edges)
+            if is_polygon(roi): # the mean number of objects inside the polygon in each interval, and the mean time a track stayed inside
+                zone = self.polygon_indexes.index(i)
+                seen = count_class_intervals({0: self.frames_seen}, edges)[0] # the number of processed frames in each interval
+                result['occupancy'] = {
+                    key: [objects / frames if frames else 0.0 for objects, frames in zip(counts, seen)] for key, counts in count_class_intervals(self.occupancy[zone], edges).items()
+                }
+                result['dwell'] = {key: 0.0 for key in self.selected_classes}
+                for key in self.selected_classes:
+                    durations = [(last - first + 1) / fps for class_name, first, last in self.dwell[zone].values() if class_name == key]
+                    result['dwell'][key] = float(np.mean(durations)) if durations else 0.0
+            result['skipped'] = self.skipped
+            results.append(result)
+        return results
+
+    def stats(self): # the time of each stage of the processing in ms
+        return self.timer.summary()
+
+    def process(self, annotate:bool=False, batch_size:int=1, queue_size:int=64, stride:int=1, motion_gate:bool=False, crop:bool=False, crop_padding:int=None, tile_size:int=None, chunks:int=1, chunk_overlap:int=CHUNK_OVERLAP): # a function that processes the video and returns the counter for each ROI and class(the annotated video is written only if annotate is True)
+        begin = time.perf_counter()
+        try:
+            video_info = sv.VideoInfo.from_video_path(self.video_file)
+            length = video_info.total_frames # get the total number of frames in the video
+            self.length = length
+            padding = None
+            if crop: # run the model only on the region around the lines
+                padding = crop_padding if crop_padding is not None else int(CROP_PADDING * max(video_info.width, video_info.height))
+                self.tiles = tile_region(crop_region(self.rois, video_info.width, video_info.height, padding), tile_size)
+        except Exception as e: # in case the video file is not found
+            print(e)
+            return {'error': str(e)} # instead of the counter, return the error message to the client
+        
+        writer = None
+        try:
+            key = None
+            if self.store is not None and self.detector is not None and self.polygons is None: # the store only keeps the crossings of lines
+                start = time.perf_counter()
+                key = self.store.key(video_hash(self.video_file), self.detector.name, list(self.selected_classes), {'stride': stride, 'motion_gate': motion_gate, 'tiles': self.tiles}) # everything that the crossings depend on, except the line(the tiles are the crop region of all the lines of the request, they change the input of the detector)
+                stored = [self.store.find(key, roi['start'], roi['end']) for roi in self.rois]
+                self.timer.add('store', start)
+                if not annotate and all(found is not None for found in stored): # every line(or a line within the tolerance) was already counted, answer right away
+                    for frame_counter, (frames, skipped) in zip(self.frame_counter, stored):
+                        frame_counter.update(frames)
+                        self.skipped = skipped
+                    return self.intervals(length, video_info.fps)
+            if annotate:
+                writer = AnnotatedWriter(self.video_file.replace(".mp4", "-result.mp4"), video_info, self.rois, timer=self.timer) # write the annotated video in the background
+            cached = self.cache.load(self.video_file) if self.cache is not None else None
+            tracks = self.cache.load_tracks(self.video_file) if cached is not None and writer is None and self.polygons is None else None # the polygons need the occupancy of each frame, they replay the cached detections
+            full_rate = True # the tracks were made from the detections of every frame
+            if tracks is not None: # the tracks of the video are cached, only the line crossing of the new ROIs is calculated
+                start = time.perf_counter()
+                self.count_tracks(tracks)
+                self.timer.add('query', start)
+            elif cached is not None: # the detections of every frame of the video are cached, only the tracking and the line crossing run again(the stride, the motion gate and the crop are not needed)
+                self.replay(cached, writer, queue_size)
+            elif chunks > 1 and writer is None and self.detector is not None and self.polygons is None: # process the chunks of the video in parallel, each worker process with its own detector(only the crossings of the lines are merged)
+                self.process_chunks(length, chunks, chunk_overlap, {'batch_size': batch_size, 'queue_size': queue_size, 'stride': stride, 'motion_gate': motion_gate})
+                full_rate = False # the tracks of the chunks can't be merged
+            else:
+                if stride != 1:
+                    self.byte_tracker = make_tracker(stride) # keep the tracks for the same time at the lower frame rate
+                full_rate = self.infer(writer, batch_size, queue_size, stride, motion_gate)
+            if self.cache is not None and tracks is None and full_rate:
+                self.cache.save_tracks(self.video_file, self.tracks)
+            if key is not None:
+                for roi, frame_counter, found in zip(self.rois, self.frame_counter, stored):
+                    if found is None: # the lines that were found are already in the store
+                        self.store.save(key, roi['start'], roi['end'], frame_counter, self.skipped)
+        except Exception as e:
+            print(e)
+            return {'error': str(e)}
+        self.timer.add('process', begin)
+        return self.intervals(length, video_info.fps) # count the number of objects that entered each ROI in each interval of the video, and then return the calculated list for each ROI and class
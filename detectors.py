@@ -0,0 +1,170 @@
+# Description: This module contains the detectors that the counter can use. Every detector takes a batch of BGR frames and returns the sv.Detections of each frame with COCO class ids, so the counter doesn't depend on the backend.
+# Usage: python detectors.py --model <path to the .pt model> --format <onnx or openvino> [--imgsz <input size>] (export a model for the fast CPU backends)
+
+# Import necessary libraries
+import argparse
+import os
+import sys
+import time
+import cv2
+import numpy as np
+import supervision as sv
+
+# Define the default detector settings
+IMGSZ = 640 # input size of the model
+CONFIDENCE = 0.25 # minimum confidence of a detection
+IOU = 0.7 # IoU threshold of the non-maximum suppression
+DARKNET_DIR = '/home/initial/CSP/darknet/' # directory of the darknet library and its python wrapper
+DARKNET_BATCH_SIZE = 4 # number of frames that the darknet network processes at once
+
+# the base class of the detectors
+class Detector:
+    def __init__(self, spec:tuple):
+        self.spec = spec # (backend, path, imgsz), enough to load the same detector in another process
+        self.name = ':'.join(str(part) for part in spec) # used as the key of the detection cache
+        self.timer = None # the StageTimer of the counter that calls the detector, if any
+
+    def detect(self, frames:list) -> list: # a function that takes a batch of BGR frames and returns the detections of each frame
+        raise NotImplementedError
+
+# a detector that uses an Ultralytics model(.pt, or an exported OpenVINO directory for the fast CPU path)
+class UltralyticsDetector(Detector):
+    def __init__(self, path:str, imgsz:int=IMGSZ):
+        super().__init__(('ultralytics', path, imgsz))
+        from ultralytics import YOLO # imported here, so that the other backends don't need ultralytics
+        self.imgsz = imgsz
+        self.model = YOLO(path)
+        if path.endswith('.pt'):
+            self.model.fuse()
+
+    def detect(self, frames:list) -> list:
+        start = time.perf_counter()
+        results = self.model(frames, imgsz=self.imgsz, verbose=False)
+        if self.timer is not None:
+            start = self.timer.add('inference', start)
+        detections = [sv.Detections.from_ultralytics(result) for result in results] # convert the results to detections only once per frame
+        if self.timer is not None:
+            self.timer.add('convert', start)
+        return detections
+
+# a detector that runs a YOLOv8 model exported to ONNX with ONNX Runtime(output: boxes and class scores of each anchor)
+class OnnxDetector(Detector):
+    def __init__(self, path:str, imgsz:int=IMGSZ):
+        super().__init__(('onnx', path, imgsz))
+        import onnxruntime # imported here, so that the other backends don't need onnxruntime
+        self.imgsz = imgsz
+        self.session = onnxruntime.InferenceSession(path, providers=onnxruntime.get_available_providers())
+        self.input_name = self.session.get_inputs()[0].name
+
+    def letterbox(self, frame: np.ndarray): # resize the frame to imgsz keeping the aspect ratio and pad it, returns the image, the scale and the padding
+        scale = self.imgsz / max(frame.shape[:2])
+        height, width = round(frame.shape[0] * scale), round(frame.shape[1] * scale)
+        image = np.full((self.imgsz, self.imgsz, 3), 114, dtype=np.uint8)
+        top, left = (self.imgsz - height) // 2, (self.imgsz - width) // 2
+        image[top:top + height, left:left + width] = cv2.resize(frame, (width, height), interpolation=cv2.INTER_LINEAR)
+        return image, scale, left, top
+
+    def detect(self, frames:list) -> list:
+        letterboxed = [self.letterbox(frame) for frame in frames]
+        blob = cv2.dnn.blobFromImages([image for image, _, _, _ in letterboxed], 1 / 255, swapRB=True) # the whole batch at once, RGB and NCHW
+        outputs = self.session.run(None, {self.input_name: blob})[0] # (batch, 4 + classes, anchors)
+        detections = []
+        for output, (_, scale, left, top) in zip(outputs, letterboxed):
+            output = output.T
+            class_id = output[:, 4:].argmax(axis=1)
+            confidence = output[np.arange(len(output)), 4 + class_id]
+            keep = confidence > CONFIDENCE
+            output, class_id, confidence = output[keep], class_id[keep], confidence[keep]
+            xywh = output[:, :4].copy()
+            xywh[:, :2] -= xywh[:, 2:] / 2 # center --> top left
+            indices = np.array(cv2.dnn.NMSBoxesBatched(xywh.tolist(), confidence.tolist(), class_id.tolist(), CONFIDENCE, IOU), dtype=int).reshape(-1)
+            xyxy = np.concatenate([xywh[indices, :2], xywh[indices, :2] + xywh[indices, 2:]], axis=1)
+            xyxy = (xyxy - np.array([left, top, left, top])) / scale # back to the frame coordinates
+            detections.append(sv.Detections(xyxy=xyxy.astype(np.float32), confidence=confidence[indices].astype(np.float32), class_id=class_id[indices].astype(int)))
+        return detections
+
+# a detector that uses the darknet library(the YOLOv4 model of the legacy scripts), the path is the cfg file and the weights and data files are next to it
+# the frames are resized straight into one preallocated buffer at the network resolution, and each batch is detected with one call to network_predict_batch
+class DarknetDetector(Detector):
+    def __init__(self, path:str, imgsz:int=None, weights:str=None, data:str=None, module:str='darknet2', batch_size:int=DARKNET_BATCH_SIZE, threshold:float=CONFIDENCE):
+        super().__init__(('darknet', path, imgsz))
+        sys.path.append(DARKNET_DIR)
+        self.darknet = __import__(module) # the python wrapper of darknet(renamed to darknet2 in config.ipynb)
+        weights = weights or os.path.join(DARKNET_DIR, os.path.splitext(os.path.basename(path))[0] + '.weights')
+        data = data or os.path.join(os.path.dirname(path), 'coco.data')
+        self.network, self.class_names, self.class_colors = self.darknet.load_network(path, data, weights, batch_size=batch_size)
+        self.class_ids = {name: i for i, name in enumerate(self.class_names)} # the order of coco.names is the order of the COCO class ids
+        self.batch_size = batch_size # the network always runs on batch_size images, the unused images of the last batch are ignored
+        self.threshold = threshold
+        self.width, self.height = self.darknet.network_width(self.network), self.darknet.network_height(self.network)
+        self.resized = np.empty((self.height, self.width, 3), dtype=np.uint8) # the resized frame, reused for every frame
+        self.buffer = np.zeros((batch_size, 3, self.height, self.width), dtype=np.float32) # the input of the network(planar RGB in [0, 1]), reused for every batch
+        self.image = self.darknet.IMAGE(self.width, self.height, 3, self.buffer.ctypes.data_as(self.darknet.POINTER(self.darknet.c_float))) # a darknet image that points to the buffer, nothing is allocated or freed per frame
+
+    def detect(self, frames:list) -> list:
+        detections = []
+        for i in range(0, len(frames), self.batch_size):
+            batch = frames[i:i + self.batch_size]
+            for j, frame in enumerate(batch):
+                cv2.resize(frame, (self.width, self.height), dst=self.resized, interpolation=cv2.INTER_LINEAR)
+                np.multiply(self.resized[:, :, ::-1].transpose(2, 0, 1), 1 / 255, out=self.buffer[j], casting='unsafe') # BGR HWC --> RGB CHW, written into the buffer without intermediate copies
+            height, width = batch[0].shape[:2] # the boxes are returned in the frame coordinates(all the frames of a video have the same size)
+            results = self.darknet.network_predict_batch(self.network, self.image, self.batch_size, width, height, self.threshold, 0.5, None, 0, 0)
+            for j in range(len(batch)):
+                self.darknet.do_nms_obj(results[j].dets, results[j].num, len(self.class_names), 0.45)
+                boxes = self.darknet.remove_negatives(results[j].dets, self.class_names, results[j].num) # (label, confidence, (x, y, w, h)) of each object
+                xyxy = [[x - w / 2, y - h / 2, x + w / 2, y + h / 2] for _, _, (x, y, w, h) in boxes]
+                detections.append(sv.Detections(
+                    xyxy=np.array(xyxy, dtype=np.float32).reshape(-1, 4),
+                    confidence=np.array([confidence for _, confidence, _ in boxes], dtype=np.float32),
+                    class_id=np.array([self.class_ids[label] for label, _, _ in boxes], dtype=int)
+                ))
+            self.darknet.free_batch_detections(results, self.batch_size)
+        return detections
+
+# the classes of the synthetic videos and the gray level of each class, so that the stub detector knows the class of each rectangle
+STUB_CLASSES = [0, 1, 2, 3, 5, 7, 9, 11]
+STUB_LEVELS = {class_id: 60 + 25 * i for i, class_id in enumerate(STUB_CLASSES)}
+
+# a deterministic detector for tests and benchmarks: it finds the filled rectangles of each gray level of a synthetic video(black background)
+class StubDetector(Detector):
+    def __init__(self, path:str=None, imgsz:int=None):
+        super().__init__(('stub', path, imgsz))
+
+    def detect(self, frames:list) -> list:
+        detections = []
+        for frame in frames:
+            gray = cv2.cvtColor(frame[::2, ::2], cv2.COLOR_BGR2GRAY) # half resolution is enough for the rectangles
+            xyxy, class_id = [], []
+            for c, level in STUB_LEVELS.items():
+                _, _, stats, _ = cv2.connectedComponentsWithStats(cv2.inRange(gray, level - 10, level + 10))
+                for x, y, w, h, area in stats[1:]: # the first component is the background
+                    if area >= 20:
+                        xyxy.append([2 * x, 2 * y, 2 * (x + w), 2 * (y + h)])
+                        class_id.append(c)
+            detections.append(sv.Detections(
+                xyxy=np.array(xyxy, dtype=np.float32).reshape(-1, 4),
+                confidence=np.full(len(xyxy), 0.9, dtype=np.float32),
+                class_id=np.array(class_id, dtype=int)
+            ))
+        return detections
+
+BACKENDS = {'ultralytics': UltralyticsDetector, 'onnx': OnnxDetector, 'darknet': DarknetDetector, 'stub': StubDetector}
+
+# a function that loads a detector from its spec, used by the server and by the worker processes
+def load_detector(backend:str, path:str=None, imgsz:int=IMGSZ):
+    return BACKENDS[backend](path, imgsz)
+
+# a function that exports an Ultralytics model for the fast CPU backends, and returns the path of the exported model(.onnx file or OpenVINO directory)
+def export_model(path:str, format:str='onnx', imgsz:int=IMGSZ):
+    from ultralytics import YOLO
+    return YOLO(path).export(format=format, imgsz=imgsz, dynamic=format == 'onnx') # dynamic batch size for ONNX Runtime
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", required=True, help="path to the .pt model")
+    parser.add_argument("--format", choices=["onnx", "openvino"], default="onnx", help="format of the exported model")
+    parser.add_argument("--imgsz", type=int, default=IMGSZ, help="input size of the exported model")
+    args = parser.parse_args() # Parse the arguments
+    print(export_model(args.model, args.format, args.imgsz))
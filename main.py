@@ -1,21 +1,16 @@
 import cv2
 import numpy as np
-import sys
-sys.path.append('/home/initial/CSP/darknet/') 
-# cd darknet
-import darknet2
+from detectors import DarknetDetector
+from tracks import IoUTracker, inside_rois
 
 # Load YOLO with Darknet
 configPath = "/home/initial/CSP/darknet/cfg/yolov4.cfg"
 weightPath = "/home/initial/CSP/darknet/yolov4.weights"
 metaPath = "/home/initial/CSP/darknet/cfg/coco.data"
+BATCH_SIZE = 4 # number of frames that the network processes at once
 
-network, class_names, class_colors = darknet2.load_network(
-    configPath,
-    metaPath,
-    weightPath,
-    batch_size=1
-)
+detector = DarknetDetector(configPath, weights=weightPath, data=metaPath, module='darknet2', batch_size=BATCH_SIZE, threshold=0.5) # the image buffer of the network is allocated once
+class_names, class_colors = detector.class_names, detector.class_colors
 
 # Load video file
 cap = cv2.VideoCapture("road_video.mp4")
@@ -70,37 +65,46 @@ def is_pedestrian(label):
 
 cyclist_count = 0
 pedestrian_count = 0
-
-while cap.isOpened():
-    ret, frame = cap.read()
-    if not ret:
+tracker = IoUTracker() # link the boxes of consecutive frames, so that each object is counted once
+counted = set() # the track ids that already entered the ROI
+
+stop = False
+while cap.isOpened() and not stop:
+    frames = [] # read BATCH_SIZE frames and detect them with one call
+    while len(frames) < BATCH_SIZE:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    if not frames:
         break
 
-    darknet_image = darknet2.make_image(frame.shape[1], frame.shape[0], 3)
-    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    darknet2.copy_image_from_bytes(darknet_image, frame_rgb.tobytes())
-
-    detections = darknet2.detect_image(network, class_names, darknet_image, thresh=0.5)
-    darknet2.free_image(darknet_image)
-
-    for label, confidence, bbox in detections:
-        x, y, w, h = map(int, bbox)
-        if (x - w // 2 > x1 and x + w // 2 < x2 and y - h // 2 > y1 and y + h // 2 < y2):
+    for frame, detections in zip(frames, detector.detect(frames)):
+        tracker_id = tracker.update(detections.xyxy, detections.class_id)
+        inside = inside_rois(detections.xyxy, [x1, y1, x2, y2])[0] # the boxes inside the ROI, checked for all boxes at once
+        for (bx1, by1, bx2, by2), class_id, track in zip(detections.xyxy[inside].astype(int), detections.class_id[inside], tracker_id[inside]):
+            label = class_names[class_id]
             color = class_colors[label]
+            entered = track not in counted # count each track only the first time it is inside the ROI
             if is_cyclist(label):
-                cyclist_count += 1
-                cv2.rectangle(frame, (x - w // 2, y - h // 2), (x + w // 2, y + h // 2), color, 2)
-                cv2.putText(frame, f"Cyclist ({label})", (x - w // 2, y - h // 2 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+                if entered:
+                    cyclist_count += 1
+                    counted.add(track)
+                cv2.rectangle(frame, (bx1, by1), (bx2, by2), color, 2)
+                cv2.putText(frame, f"Cyclist ({label}) #{track}", (bx1, by1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
             elif is_pedestrian(label):
-                pedestrian_count += 1
-                cv2.rectangle(frame, (x - w // 2, y - h // 2), (x + w // 2, y + h // 2), color, 2)
-                cv2.putText(frame, "Pedestrian", (x - w // 2, y - h // 2 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-
-    cv2.rectangle(frame, roi[0], roi[1], (255, 0, 0), 2)
-    cv2.imshow("Frame", frame)
-    key = cv2.waitKey(1)
-    if key == 27:  # Press 'ESC' to exit
-        break
+                if entered:
+                    pedestrian_count += 1
+                    counted.add(track)
+                cv2.rectangle(frame, (bx1, by1), (bx2, by2), color, 2)
+                cv2.putText(frame, f"Pedestrian #{track}", (bx1, by1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+        cv2.rectangle(frame, roi[0], roi[1], (255, 0, 0), 2)
+        cv2.imshow("Frame", frame)
+        key = cv2.waitKey(1)
+        if key == 27:  # Press 'ESC' to exit
+            stop = True
+            break
 
 cap.release()
 cv2.destroyAllWindows()
@@ -0,0 +1,65 @@
+# Description: This module contains the wire protocol shared by the client and the server. Every message is a header(message type, encoding, length of the body) followed by the body, so that messages of any size are received completely.
+
+# Import necessary libraries
+import json
+import struct
+try:
+    import msgpack # optional, used for the compact binary encoding
+except ImportError:
+    msgpack = None
+
+# Define the message types
+REQUEST = 1 # CLIENT -> SERVER: the list of ROIs
+ACCEPTED = 2 # SERVER -> CLIENT: the job id and the position in the queue
+RESULT = 3 # SERVER -> CLIENT: the counts of each ROI
+ERROR = 4 # SERVER -> CLIENT: the error message
+PROGRESS = 5 # SERVER -> CLIENT: the frames processed, the fps and the current counts of each ROI, sent while the job is processed
+HEALTH = 6 # CLIENT -> SERVER: a health check(empty body), SERVER -> CLIENT: whether the models are loaded, their load and warm-up times and the queue
+
+# Define the encodings of the body
+JSON = 0
+MSGPACK = 1 # compact binary encoding, only available if msgpack is installed
+
+HEADER = struct.Struct('!BBI') # message type, encoding, length of the body(network byte order)
+MAX_MESSAGE_SIZE = 256 * 1024 * 1024 # refuse bodies larger than this, so that a bad header can't make the receiver allocate gigabytes
+
+# the encoding to use by default: JSON, which every server can decode(msgpack is opt-in, the server may not have it installed)
+DEFAULT_ENCODING = JSON
+
+# a function that encodes a message with the given encoding
+def encode(message, encoding=JSON):
+    if encoding == MSGPACK:
+        return msgpack.packb(message, use_single_float=False)
+    return json.dumps(message).encode()
+
+# a function that decodes a message with the given encoding
+def decode(body, encoding=JSON):
+    if encoding == MSGPACK:
+        if msgpack is None:
+            raise ValueError("msgpack encoding is not available, install msgpack")
+        return msgpack.unpackb(body)
+    return json.loads(body.decode())
+
+# a function that sends one message with its header
+def send_message(sock, message_type, message, encoding=JSON):
+    body = encode(message, encoding)
+    sock.sendall(HEADER.pack(message_type, encoding, len(body)) + body)
+
+# a function that receives exactly size bytes from the socket
+def recv_exactly(sock, size):
+    data = bytearray(size)
+    view = memoryview(data)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if n == 0: # the other side closed the connection in the middle of a message
+            raise ConnectionError("connection closed before the whole message was received")
+        received += n
+    return bytes(data)
+
+# a function that receives one message and returns its type, the decoded message and the encoding used
+def recv_message(sock):
+    message_type, encoding, length = HEADER.unpack(recv_exactly(sock, HEADER.size))
+    if length > MAX_MESSAGE_SIZE:
+        raise ValueError(f"message of {length} bytes is larger than {MAX_MESSAGE_SIZE} bytes")
+    return message_type, decode(recv_exactly(sock, length), encoding), encoding
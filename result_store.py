@@ -0,0 +1,55 @@
+# Description: This module contains the persistent store of the results of each ROI. The crossing frames of each class are stored for each (video content, model, class set, processing options, line), so that a repeated request is answered without processing the video, and a slightly re-drawn line can reuse the results of the earlier one.
+
+# Import necessary libraries
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+# Define the store settings
+STORE_PATH = os.path.join('cache', 'results.sqlite3') # the SQLite database of the store, next to the detection cache
+STORE_SIZE = 100000 # maximum number of stored lines, the least recently used ones are evicted above this number
+TOLERANCE = 5 # maximum distance in pixels between the ends of a stored line and of a requested line to reuse the stored results(0 = exact match)
+
+# a class that stores the crossing frames of each class for each line in a SQLite database, and finds the stored line closest to a requested line
+class ResultStore:
+    def __init__(self, path:str=STORE_PATH, max_size:int=STORE_SIZE, tolerance:float=TOLERANCE):
+        self.path = path
+        self.max_size = max_size
+        self.tolerance = tolerance
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with closing(self.connect()) as conn, conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS results (id INTEGER PRIMARY KEY, key TEXT, x1 REAL, y1 REAL, x2 REAL, y2 REAL, frames TEXT, skipped REAL, used REAL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS results_key ON results (key)')
+            conn.execute('CREATE INDEX IF NOT EXISTS results_used ON results (used)')
+
+    def connect(self): # one connection for each call, so that the workers never share a connection
+        return sqlite3.connect(self.path, timeout=30)
+
+    def key(self, video_hash:str, model_name:str, classes:list, options:dict): # the key of everything except the line that the results depend on
+        return hashlib.sha256(json.dumps([video_hash, model_name, sorted(classes), options], sort_keys=True).encode()).hexdigest()
+
+    def find(self, key:str, start:tuple, end:tuple): # return the (crossing frames of each class, skipped) of the closest stored line within the tolerance, or None
+        (x1, y1), (x2, y2) = start, end
+        with closing(self.connect()) as conn, conn:
+            row = conn.execute(
+                'SELECT id, frames, skipped FROM ('
+                ' SELECT id, frames, skipped, MIN('
+                '  MAX(ABS(x1 - ?), ABS(y1 - ?), ABS(x2 - ?), ABS(y2 - ?)),'
+                '  MAX(ABS(x1 - ?), ABS(y1 - ?), ABS(x2 - ?), ABS(y2 - ?))'
+                ' ) AS distance FROM results WHERE key = ?'
+                ') WHERE distance <= ? ORDER BY distance LIMIT 1',
+                (x1, y1, x2, y2, x2, y2, x1, y1, key, self.tolerance)
+            ).fetchone() # the line can be drawn in either direction, the crossings are the same
+            if row is None:
+                return None
+            conn.execute('UPDATE results SET used = ? WHERE id = ?', (time.time(), row[0])) # mark the line as recently used
+        return json.loads(row[1]), row[2]
+
+    def save(self, key:str, start:tuple, end:tuple, frames:dict, skipped:float): # store the crossing frames of each class of a line
+        (x1, y1), (x2, y2) = start, end
+        with closing(self.connect()) as conn, conn:
+            conn.execute('INSERT INTO results (key, x1, y1, x2, y2, frames, skipped, used) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (key, x1, y1, x2, y2, json.dumps(frames), skipped, time.time()))
+            conn.execute('DELETE FROM results WHERE id IN (SELECT id FROM results ORDER BY used DESC LIMIT -1 OFFSET ?)', (self.max_size,)) # evict the least recently used lines above max_size
@@ -1,141 +1,327 @@
 # Description: This script is the server side of the application. It listens for incoming connections from the client side, receives the ROI coordinates from the client, processes the video and sends the results back to the client.
+# Usage: python server.py [--workers <number of model workers>] [--queue-size <number of jobs that can wait>] [--profile <cprofile or trace>] [--model <name of the default model>] [--imgsz <input size of the default model>]
 
 # Import necessary libraries
-import cv2
-import numpy as np
+import argparse
+import cProfile
+import itertools
 import json
-import sys
-import supervision as sv
-from ultralytics import YOLO
-import sockets
+import os
+import queue
+import socket
+import threading
+import time
+import protocol # only the standard library and the protocol are imported at startup, the counting engine(numpy, supervision, the detectors) is imported in the background
+
+STARTED = time.perf_counter() # the time at which the server started, the startup times are relative to it
 
 # Define the host and port number(must be the same as the client)
 host = '0.0.0.0'
 port = 4000
 
-# Load the YOLO model
-MODEL = "models/yolov8x.pt"
-model = YOLO(MODEL)
-model.fuse()
-
-# a function that takes a list of numbers and a max value and counts how many numbers are in each equally devided intervals of the max value
-# used for printing the graph results of the counter
-# to see how many objects entered the ROI in each interval of the video
-def count_intervals(numbers, max_value, num_intervals):
-    intervals = np.linspace(0, max_value, num_intervals + 1)
-    counts = np.zeros(num_intervals)
-    for number in numbers:
-        for i in range(num_intervals):
-            if intervals[i] < number <= intervals[i + 1]:
-                counts[i] += 1
-    return counts.tolist() # a list of counts of numbers in each interval
-    
-# a class that takes the start and end coordinates of the ROI, the video file path and processes the video to count the number of objects that entered the ROI
-class Counter:
-    def __init__(self, start:tuple, end:tuple, video_file:str):
-        self.start = start
-        self.end = end
-        self.video_file = video_file
-        self.video_file = '/home/initial/CSP/assets/' + self.video_file + '.mp4'
-        
-        self.selected_classes = {'person':0, 'bicycle':1, 'motorcycle':3, 'car':2, 'bus':5, 'truck':7}
-        self.byte_tracker = {
-            'person': sv.ByteTrack(track_activation_threshold=0.25, lost_track_buffer=30, minimum_matching_threshold=0.7, frame_rate=30),
-            'bicycle': sv.ByteTrack(track_activation_threshold=0.25, lost_track_buffer=30, minimum_matching_threshold=0.7, frame_rate=30),
-            'motorcycle': sv.ByteTrack(track_activation_threshold=0.25, lost_track_buffer=30, minimum_matching_threshold=0.7, frame_rate=30),
-            'car': sv.ByteTrack(track_activation_threshold=0.25, lost_track_buffer=30, minimum_matching_threshold=0.7, frame_rate=30),
-            'bus': sv.ByteTrack(track_activation_threshold=0.25, lost_track_buffer=30, minimum_matching_threshold=0.7, frame_rate=30),
-            'truck': sv.ByteTrack(track_activation_threshold=0.25, lost_track_buffer=30, minimum_matching_threshold=0.7, frame_rate=30)
-        } # initialize the byte tracker for each class
-        self.line_zones = {
-            'person': sv.LineZone(start=sv.Point(*self.start), end=sv.Point(*self.end)),
-            'bicycle': sv.LineZone(start=sv.Point(*self.start), end=sv.Point(*self.end)),
-            'motorcycle': sv.LineZone(start=sv.Point(*self.start), end=sv.Point(*self.end)),
-            'car': sv.LineZone(start=sv.Point(*self.start), end=sv.Point(*self.end)),
-            'bus': sv.LineZone(start=sv.Point(*self.start), end=sv.Point(*self.end)),
-            'truck': sv.LineZone(start=sv.Point(*self.start), end=sv.Point(*self.end))
-        } # initialize the line zone for each class with the start and end coordinates of the ROI
-        self.counter = {
-            'person': 0,
-            'bicycle': 0,
-            'motorcycle': 0,
-            'car': 0,
-            'bus': 0,
-            'truck': 0
-        } # initialize the counter for each class
-        self.frame_counter = {
-            'person': [],
-            'bicycle': [],
-            'motorcycle': [],
-            'car': [],
-            'bus': [],
-            'truck': []
-        } # initialize the frame counter for each class --> it is a list that contains at which frame number an object entered the ROI
-        
-    def process(self): # a function that processes the video and returns the counter for each class
+# The models that the clients can ask for: name --> (backend, path), the ONNX and OpenVINO models are exported with detectors.py for the fast CPU path
+MODELS = {
+    'yolov8x': ('ultralytics', 'models/yolov8x.pt'),
+    'yolov8n': ('ultralytics', 'models/yolov8n.pt'),
+    'yolov8x-onnx': ('onnx', 'models/yolov8x.onnx'),
+    'yolov8n-onnx': ('onnx', 'models/yolov8n.onnx'),
+    'yolov8x-openvino': ('ultralytics', 'models/yolov8x_openvino_model/'),
+    'yolov8n-openvino': ('ultralytics', 'models/yolov8n_openvino_model/'),
+    'yolov4': ('darknet', '/home/initial/CSP/darknet/cfg/yolov4.cfg'),
+}
+MODEL = 'yolov8x' # the model used if the request doesn't ask for one
+IMGSZ = 640 # the input size used if the request doesn't ask for one
+IMGSZES = (320, 416, 480, 512, 640, 736, 960, 1280) # the input sizes that the clients can ask for, each one is a separate detector in the pool
+MAX_LOADED = 4 # maximum number of loaded detectors of all the models and sizes, the idle detectors of the least recently used models are evicted above this number
+
+# The cache of the detections of each video for each detector, so that re-drawn ROIs don't run the model again
+detection_caches = {}
+# The store of the crossings of each line, so that repeated requests(and lines re-drawn within a few pixels) are answered right away
+result_store = None
+
+# Define the inference settings
+BATCH_SIZE = 8 # number of frames that the model processes at once
+QUEUE_SIZE = 64 # number of decoded frames that can wait for the model
+CHUNKS = 1 # number of worker processes that process the chunks of one video in parallel, each one with its own model(1 = process the video in order in the model worker)
+TILE_SIZE = None # split the crop region around the lines in tiles of at most TILE_SIZE pixels(None = one crop)
+
+# Define the job settings
+WORKERS = 1 # number of model workers, each worker borrows a model from the pool while it processes a job
+JOB_QUEUE_SIZE = 8 # number of jobs that can wait for a worker, the clients get a "busy" response when the queue is full
+PROFILE = None # write a profile of each job in PROFILE_DIR: "cprofile"(job-<id>.prof) or "trace"(job-<id>.json, Chrome trace of the stages)
+PROFILE_DIR = 'profiles'
+
+# a class that keeps the loaded detectors of each model and input size, the workers borrow a detector for each video and give it back when the video is processed
+# at most size detectors of each model and max_loaded detectors in total are loaded, each one is warmed up with a dummy inference so that the first request is not slow
+class ModelPool:
+    def __init__(self, size:int, preload:tuple=None, max_loaded:int=MAX_LOADED):
+        self.size = size # the maximum number of detectors of each model(one for each worker)
+        self.max_loaded = max(max_loaded, size) # the maximum number of detectors of all the models, so that the clients can't fill the memory with many models and sizes
+        self.idle = {} # detector spec --> the loaded detectors that no worker is using
+        self.loaded = {} # detector spec --> the number of loaded detectors(idle, in use or being loaded)
+        self.used = {} # detector spec --> the time at which a detector of the spec was last given back, the least recently used idle detectors are evicted first
+        self.times = {} # detector spec --> the load and warm-up time of the last loaded detector in seconds
+        self.condition = threading.Condition()
+        self.ready = threading.Event() # set when the preloaded model is loaded and warmed up(or failed to load)
+        self.error = None # the error of the preloading, if any
+        if preload is not None: # load the detectors of the default model in the background, so that the server answers right away
+            threading.Thread(target=self.preload, args=preload, daemon=True).start()
+        else:
+            self.ready.set()
+
+    def spec(self, name:str, imgsz:int): # the (backend, path, imgsz) of a model that the clients can ask for
+        if name not in MODELS:
+            raise ValueError(f"unknown model {name}, the models are {', '.join(MODELS)}")
+        if imgsz not in IMGSZES:
+            raise ValueError(f"unsupported input size {imgsz}, the sizes are {', '.join(map(str, IMGSZES))}")
+        return (*MODELS[name], imgsz)
+
+    def evict(self): # unload the idle detector of the least recently used spec, called with the lock held, returns False if every detector is in use
+        specs = [spec for spec, detectors in self.idle.items() if detectors]
+        if not specs:
+            return False
+        spec = min(specs, key=lambda spec: self.used.get(spec, 0))
+        detector = self.idle[spec].pop()
+        self.loaded[spec] -= 1
+        if self.loaded[spec] == 0:
+            del self.loaded[spec]
+        if not self.idle[spec]:
+            del self.idle[spec]
+        print(f"Model {detector.name} evicted")
+        return True # the memory is freed when the detector is garbage collected
+
+    def load(self, spec:tuple): # load a detector and warm it up, in a slot of self.loaded that the caller has reserved(the slot is freed if the loading fails)
         try:
-            cap = cv2.VideoCapture(self.video_file)
-            length = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) # get the total number of frames in the video
-        except Exception as e: # in case the video file is not found
-            print(e)
-            return {'error': str(e)} # instead of the counter, return the error message to the client
-        
-        def callback(frame: np.ndarray, index:int) -> np.ndarray: # define a callable function that takes a frame and the frame number and processes the frame
-            results = model(frame, verbose=False)[0] # process the frame using the YOLO model
-            for key in self.selected_classes:
-                detections = sv.Detections.from_ultralytics(results)
-                detections = detections[detections.class_id == self.selected_classes[key]] # select only the class that we are interested in
-                detections = self.byte_tracker[key].update_with_detections(detections) # update the byte tracker with the detections
-                self.line_zones[key].trigger(detections) # trigger the line zone with the detections and update the counter if detection enters the ROI
-                if self.line_zones[key].in_count + self.line_zones[key].out_count > self.counter[key]: # if the counter is updated(the object entered the ROI), append the frame number to the frame counter
-                    self.counter[key] = self.line_zones[key].in_count + self.line_zones[key].out_count
-                    self.frame_counter[key].append(index)
-            return None
-        
+            import numpy as np
+            from detectors import load_detector
+            start = time.perf_counter()
+            detector = load_detector(*spec)
+            loaded = time.perf_counter()
+            detector.detect([np.zeros((spec[2] or 640, spec[2] or 640, 3), dtype=np.uint8)]) # the first inference allocates the memory and compiles the kernels
+        except Exception:
+            with self.condition:
+                self.loaded[spec] -= 1
+                if self.loaded[spec] == 0:
+                    del self.loaded[spec]
+                self.condition.notify_all() # a waiting worker can try to load it
+            raise
+        self.times[spec] = {'load_s': loaded - start, 'warmup_s': time.perf_counter() - loaded}
+        print(f"Model {detector.name} loaded in {self.times[spec]['load_s']:.2f} s, warmed up in {self.times[spec]['warmup_s']:.2f} s")
+        return detector
+
+    def preload(self, name:str, imgsz:int): # load the detectors of a model for every worker
         try:
-            sv.process_video(
-                source_path = self.video_file,
-                target_path = self.video_file.replace(".mp4", "-result.mp4"),
-                callback=callback
-            ) # process the video using the callback function
-        except Exception as e:
-            print(e)
-            return {'error': str(e)}
-        return {key: count_intervals(self.frame_counter[key], length, 6) for key in self.frame_counter} # use the count_intervals function to count the number of objects that entered the ROI in each interval of the video, and then return the calculated list for each class
+            spec = self.spec(name, imgsz)
+            for _ in range(self.size):
+                with self.condition:
+                    if self.loaded.get(spec, 0) >= self.size: # the workers have already loaded them
+                        break
+                    self.loaded[spec] = self.loaded.get(spec, 0) + 1
+                self.release(self.load(spec))
+            print(f"Ready {time.perf_counter() - STARTED:.2f} s after startup")
+        except Exception as e: # the jobs try to load the model again when they ask for it
+            print(f"Preloading {name} failed: {e}")
+            self.error = str(e)
+        self.ready.set()
+
+    def acquire(self, name:str, imgsz:int): # borrow a detector of the model, load it if less than size detectors are loaded, otherwise wait until one is given back
+        spec = self.spec(name, imgsz)
+        with self.condition:
+            while not self.idle.get(spec):
+                if self.loaded.get(spec, 0) < self.size and (sum(self.loaded.values()) < self.max_loaded or self.evict()): # there is room for one more detector(maybe after evicting an idle detector of another model)
+                    break
+                self.condition.wait()
+            if self.idle.get(spec):
+                return self.idle[spec].pop()
+            self.loaded[spec] = self.loaded.get(spec, 0) + 1 # load it outside the lock, so that the other models can be borrowed meanwhile
+        return self.load(spec)
+
+    def release(self, detector): # give a detector back to the pool
+        with self.condition:
+            self.idle.setdefault(detector.spec, []).append(detector)
+            self.used[detector.spec] = time.perf_counter()
+            self.condition.notify_all()
 
+    def status(self): # the loaded models and their load and warm-up times, for the health checks
+        with self.condition:
+            return {
+                'ready': self.ready.is_set(),
+                'error': self.error,
+                'models': [{'spec': list(spec), 'loaded': count, 'idle': len(self.idle.get(spec, [])), **self.times.get(spec, {})} for spec, count in self.loaded.items()]
+            }
 
-def calculate(roi_coordinates):
-    asdf = [] # list that will contain the final result to send to the client
-    for roi in roi_coordinates: # for each roi 
-        counter = Counter(roi['start'], roi['end'], roi['video']) # define the counter object
-        a = counter.process() # and process the counter
+# a function that returns the detection cache of a detector(the detections depend on the backend, the weights and the input size)
+def get_cache(detector):
+    from cache import DetectionCache
+    if detector.name not in detection_caches:
+        detection_caches[detector.name] = DetectionCache(detector.name)
+    return detection_caches[detector.name]
+
+# a function that returns the result store, created on the first job
+def get_store():
+    global result_store
+    from result_store import ResultStore
+    if result_store is None:
+        result_store = ResultStore()
+    return result_store
+
+def calculate(roi_coordinates, pool, progress=None, timer=None):
+    from counter import Counter, StageTimer
+    timer = timer if timer is not None else StageTimer() # the time of each stage of the job, shared by the counters of all the videos
+    asdf = [None] * len(roi_coordinates) # list that will contain the final result to send to the client(in the same order as the ROIs)
+    videos = {} # group the ROIs by video and model, so that each video is decoded and detected only once for each model
+    for i, roi in enumerate(roi_coordinates):
+        videos.setdefault((roi['video'], roi.get('model') or MODEL, roi.get('imgsz') or IMGSZ), []).append(i)
+    for (video, name, imgsz), indices in videos.items(): # for each video
         try:
-            if a['error']:
-                return a # if an error message is returned, return the error message to the client
-        except KeyError:
-            a['color'] = roi['color'] # if no error, add the color of the ROI to the result, so that the client will know which ROI the result belongs to
-        asdf.append(a)
+            detector = pool.acquire(name, imgsz) # borrow a detector of the model from the pool
+        except Exception as e: # in case the model is unknown or can't be loaded
+            print(e)
+            return {'error': str(e)}
+        try:
+            counter = Counter([roi_coordinates[i] for i in indices], video, detector, get_cache(detector), progress, timer, get_store()) # define the counter object with all the ROIs of the video(it reports its progress to the client while processing)
+            a = counter.process(
+                annotate=any(roi_coordinates[i].get('annotate', False) for i in indices), # the annotated video is written only if one of the ROIs asks for it
+                batch_size=BATCH_SIZE,
+                queue_size=QUEUE_SIZE,
+                stride=max(roi_coordinates[i].get('stride') or 1 for i in indices), # the largest stride asked by the ROIs of the video
+                motion_gate=any(roi_coordinates[i].get('motion_gate', False) for i in indices), # skip the model on the frames that didn't change
+                crop=any(roi_coordinates[i].get('crop', False) for i in indices), # run the model only on the region around the lines of the video
+                crop_padding=max((roi_coordinates[i]['crop_padding'] for i in indices if roi_coordinates[i].get('crop_padding') is not None), default=None),
+                tile_size=TILE_SIZE,
+                chunks=CHUNKS
+            ) # and process the counter
+        finally:
+            pool.release(detector) # give the detector back, so that another worker can use it
+        if isinstance(a, dict):
+            return a # if an error message is returned, return the error message to the client
+        for i, result in zip(indices, a):
+            result['color'] = roi_coordinates[i].get('color') # add the color and the name of the ROI to the result, so that the client will know which ROI the result belongs to
+            result['name'] = roi_coordinates[i].get('name') or roi_coordinates[i].get('color')
+            asdf[i] = result
+    if any(roi.get('stats', False) for roi in roi_coordinates): # the time of each stage of the job, only if the client asks for it
+        stats = timer.summary()
+        for result in asdf:
+            result['stats'] = stats
     return asdf
 
+# a function that tells if the client is still connected, without blocking(the client sends nothing while waiting, so an empty read means that it closed the connection)
+def is_connected(conn):
+    try:
+        return conn.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) != b''
+    except BlockingIOError:
+        return True
+    except OSError:
+        return False
+
+# a function that imports the counting engine in the background, so that the server starts answering right away and the first job doesn't wait for the imports
+def import_engine():
+    start = time.perf_counter()
+    import cache, counter # noqa: F401
+    print(f"Counting engine imported in {time.perf_counter() - start:.2f} s")
 
-with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s: # create a socket object
-    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1) # make sure the socket is reusable
-    s.bind((host, port)) # bind the socket to the host and port defined above, so that the client can connect to it
-    s.listen() # start listening for incoming connections
-    print("Waiting for ROI coordinates...")
-    while 1: # while the server is running, keep waiting for incoming connections
-        conn, addr = s.accept() # accept the incoming connection
+# a function that runs in each worker thread: it processes the jobs in the queue one by one, with the detectors borrowed from the pool
+def worker(jobs, pool, calculate, profile=None):
+    from counter import StageTimer
+    while 1:
+        job_id, conn, addr, roi_coordinates, encoding = jobs.get() # wait for a job
         with conn:
-            print(f"Connected by {addr}")
-            data = conn.recv(1024) # receive the ROI coordinates from the client(1024 bytes is enough for the coordinates)
-            roi_coordinates = json.loads(data.decode()) # decode the received data to a list of dictionaries
-            print(roi_coordinates)
-            print("calculating...")
-            roi_counters = calculate(roi_coordinates) # calculate the counter for each ROI
-            results = json.dumps(roi_counters) # Send results back to the client
-            conn.sendall(results.encode())
-            print("Results sent to client")
-            print("Waiting for ROI coordinates...")
+            print(f"Job {job_id} from {addr} calculating...")
+            def send_progress(message): # stream the progress to the client, and stop the job if the client has disconnected
+                if not is_connected(conn):
+                    raise ConnectionError("client disconnected, job cancelled")
+                protocol.send_message(conn, protocol.PROGRESS, message, encoding)
+            timer = StageTimer(trace=profile == 'trace')
+            profiler = cProfile.Profile() if profile == 'cprofile' else None
+            try:
+                if profiler is not None:
+                    profiler.enable()
+                roi_counters = calculate(roi_coordinates, pool, send_progress, timer) # calculate the counter for each ROI
+            except Exception as e:
+                print(e)
+                roi_counters = {'error': str(e)}
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+            print(f"Job {job_id} stages(ms): " + ", ".join(f"{stage} {stats['total_ms']:.0f} total, p50 {stats['p50_ms']:.2f}, p95 {stats['p95_ms']:.2f}" for stage, stats in timer.summary().items())) # log where the time of the job went
+            if profile is not None:
+                os.makedirs(PROFILE_DIR, exist_ok=True)
+                if profiler is not None:
+                    profiler.dump_stats(os.path.join(PROFILE_DIR, f'job-{job_id}.prof')) # open with snakeviz or pstats
+                else:
+                    with open(os.path.join(PROFILE_DIR, f'job-{job_id}.json'), 'w') as f:
+                        json.dump(timer.trace(), f) # open with chrome://tracing or Perfetto
+            try:
+                message_type = protocol.ERROR if isinstance(roi_counters, dict) else protocol.RESULT
+                protocol.send_message(conn, message_type, roi_counters, encoding) # Send results back to the client(in the encoding of the request)
+                print(f"Job {job_id} results sent to client")
+            except OSError as e: # the client has disconnected while waiting
+                print(f"Job {job_id} client disconnected: {e}")
+        jobs.task_done()
+
+# a function that runs in a thread for each connection: it receives the ROI coordinates and puts the job in the queue, or answers a health check
+def handle(conn, addr, jobs, job_ids, lock, status):
+    try:
+        message_type, roi_coordinates, encoding = protocol.recv_message(conn) # receive the ROI coordinates from the client
+        if message_type == protocol.HEALTH: # answered even while the models are loading
+            protocol.send_message(conn, protocol.HEALTH, status(), encoding)
+            conn.close()
+            return
+        print(f"Connected by {addr}")
+        if message_type != protocol.REQUEST:
+            raise ValueError(f"unexpected message type {message_type}")
+        print(roi_coordinates)
+        with lock: # only one handler at a time checks the queue, so that the job fits in the queue after the client is told its position
+            if jobs.full():
+                protocol.send_message(conn, protocol.ERROR, {'error': 'The server is busy, try again later.', 'busy': True}, encoding) # don't keep the client waiting if the queue is full
+                conn.close()
+                return
+            job_id = next(job_ids)
+            protocol.send_message(conn, protocol.ACCEPTED, {'job': job_id, 'position': jobs.qsize() + 1}, encoding) # tell the client its job id and position in the queue(before the worker can send the results)
+            jobs.put_nowait((job_id, conn, addr, roi_coordinates, encoding)) # the worker closes the connection after sending the results
+    except Exception as e: # in case the request is invalid or the client has disconnected
+        print(e)
+        try:
+            protocol.send_message(conn, protocol.ERROR, {'error': str(e)})
+        except OSError:
+            pass
+        conn.close()
 
+# a function that accepts the connections and starts the workers, so that no client is blocked while a video is processed
+# the models are loaded in the background after the socket is bound(pool=None: a pool of the default model with one detector for each worker)
+def serve(host, port, workers=WORKERS, queue_size=JOB_QUEUE_SIZE, pool=None, calculate=calculate, ready=None, profile=None):
+    jobs = queue.Queue(maxsize=queue_size) # the jobs waiting for a worker
+    job_ids = itertools.count(1)
+    lock = threading.Lock()
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s: # create a socket object
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1) # make sure the socket is reusable
+        s.bind((host, port)) # bind the socket to the host and port defined above, so that the client can connect to it
+        s.listen() # start listening for incoming connections
+        listening = time.perf_counter() - STARTED
+        print(f"Waiting for ROI coordinates...(listening {listening:.2f} s after startup)")
+        threading.Thread(target=import_engine, daemon=True).start()
+        pool = pool if pool is not None else ModelPool(workers, preload=(MODEL, IMGSZ)) # the jobs accepted before the models are loaded wait in the queue
+        for _ in range(workers):
+            threading.Thread(target=worker, args=(jobs, pool, calculate, profile), daemon=True).start()
+        def status(): # the answer to the health checks
+            return dict(pool.status(), uptime_s=time.perf_counter() - STARTED, listening_s=listening, workers=workers, queue=jobs.qsize(), queue_size=queue_size)
+        if ready is not None:
+            ready.set() # tell the caller that the server is accepting connections
+        while 1: # while the server is running, keep waiting for incoming connections
+            conn, addr = s.accept() # accept the incoming connection
+            threading.Thread(target=handle, args=(conn, addr, jobs, job_ids, lock, status), daemon=True).start() # receive the request in its own thread, so that the next connection is accepted right away
 
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=WORKERS, help="number of model workers")
+    parser.add_argument("--queue-size", type=int, default=JOB_QUEUE_SIZE, help="number of jobs that can wait for a worker")
+    parser.add_argument("--chunks", type=int, default=CHUNKS, help="number of worker processes that process the chunks of one video in parallel")
+    parser.add_argument("--model", choices=list(MODELS), default=MODEL, help="model used if the request doesn't ask for one")
+    parser.add_argument("--imgsz", type=int, default=IMGSZ, choices=IMGSZES, help="input size used if the request doesn't ask for one")
+    parser.add_argument("--profile", choices=["cprofile", "trace"], default=PROFILE, help="write a cProfile dump or a Chrome trace of each job in the profiles folder")
+    args = parser.parse_args() # Parse the arguments
+    CHUNKS = args.chunks
+    MODEL = args.model
+    IMGSZ = args.imgsz
+    serve(host, port, args.workers, args.queue_size, profile=args.profile)
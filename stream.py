@@ -0,0 +1,176 @@
+# Description: This script counts the objects that cross the lines or enter the polygons in a live stream(RTSP, camera or a video file replayed at real-time pace). The counts are kept in rolling windows of fixed length, and each window is printed as one line of JSON as soon as it closes.
+# Usage: python stream.py --source <url, camera index or video file> --line <x1> <y1> <x2> <y2> [--line ...] [--polygon <x1> <y1> <x2> <y2> <x3> <y3> ...] [--window <seconds>] [--fast]
+
+# Import necessary libraries
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+import cv2
+from counter import Counter, StageTimer
+from detectors import BACKENDS, IMGSZ, load_detector
+
+# Define the stream settings
+WINDOW = 60.0 # length of the count windows in seconds
+SOURCE_QUEUE_SIZE = 8 # number of captured frames that can wait for the model, the oldest frame is dropped when the queue is full
+PRUNE_EVERY = 300 # number of frames between two removals of the old tracks from the zones
+PRUNE_AGE = 300 # number of frames after which a track that was not seen is removed from the zones
+REMOVED_TRACKS = 1000 # maximum number of removed tracks kept by the byte tracker
+
+# a class that captures the frames of any cv2.VideoCapture source in a background thread, and drops the oldest frames when the model falls behind
+# a video file is replayed at its frame rate by default, like a camera, or read as fast as the model processes it without dropping any frame(realtime=False)
+class LiveSource:
+    def __init__(self, source, queue_size:int=SOURCE_QUEUE_SIZE, realtime:bool=None):
+        self.source = source
+        self.live = not (isinstance(source, str) and os.path.isfile(source)) # a camera or a stream, it doesn't wait for the model
+        self.realtime = realtime if realtime is not None else not self.live # replay the source at its frame rate(for video files used as a camera)
+        self.queue = queue.Queue(maxsize=queue_size) # bounded, so that the memory stays bounded however long the stream runs
+        self.dropped = 0 # the number of frames dropped because the model was behind
+        self.error = None # the exception raised in the capture thread, if any
+        self.stopped = threading.Event()
+        self.start = time.perf_counter() # the time at which the capture started, the timestamps of the frames are relative to it
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def put(self, item): # put an item in the queue, and drop the oldest frame if the queue is full(a video file read as fast as possible waits for the model instead)
+        while True:
+            try:
+                if self.live or self.realtime:
+                    self.queue.put_nowait(item)
+                else:
+                    self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if not (self.live or self.realtime):
+                    if self.stopped.is_set(): # the consumer stopped reading
+                        return
+                    continue
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def run(self): # the capture thread: read the frames until the source ends or the consumer stops, then put None
+        try:
+            cap = cv2.VideoCapture(self.source)
+            if not cap.isOpened():
+                raise IOError(f"Could not open source {self.source}")
+            fps = cap.get(cv2.CAP_PROP_FPS) or 30
+            index = 0
+            while not self.stopped.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if self.realtime: # wait until the time of the frame, like a camera
+                    delay = self.start + index / fps - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                self.put((time.perf_counter() - self.start if self.live else index / fps, frame)) # the time of the frame in the video for a file, so that the windows are in video time
+                index += 1
+            cap.release()
+        except Exception as e:
+            self.error = e
+        self.put(None)
+
+    def __iter__(self): # yield the timestamp and the frame of each captured frame
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            yield item
+        if self.error is not None:
+            raise self.error
+
+    def close(self): # stop the capture thread
+        self.stopped.set()
+        self.thread.join()
+
+# a counter that counts the crossings of a live stream in rolling windows of fixed length, and keeps bounded memory however long the stream runs
+class StreamCounter(Counter):
+    def __init__(self, rois:list, source, detector=None, window:float=WINDOW, emit=print, queue_size:int=SOURCE_QUEUE_SIZE, realtime:bool=None):
+        super().__init__(rois, '', detector)
+        self.source = source # anything that cv2.VideoCapture can open
+        self.window = window
+        self.emit = emit # a function called with each window as soon as it closes
+        self.queue_size = queue_size
+        self.realtime = realtime
+        self.tracks = None # the tracks are not kept, so that the memory doesn't grow with the stream
+        self.last_seen = {} # tracker id --> the last frame where the track was seen, used to remove the old tracks from the zones
+
+    def update(self, detections, index:int):
+        detections = super().update(detections, index)
+        for tracker_id in detections.tracker_id:
+            self.last_seen[tracker_id] = index
+        return detections
+
+    def prune(self, index:int): # remove the tracks that were not seen for PRUNE_AGE frames from the zones and the tracker, so that their state doesn't grow with the stream
+        old = [tracker_id for tracker_id, seen in self.last_seen.items() if index - seen > PRUNE_AGE]
+        for tracker_id in old:
+            del self.last_seen[tracker_id]
+        self.forget(old)
+        removed_tracks = getattr(self.byte_tracker, 'removed_tracks', None)
+        if removed_tracks is not None and len(removed_tracks) > REMOVED_TRACKS:
+            del removed_tracks[:-REMOVED_TRACKS]
+
+    def close_window(self, start:float, dropped:int, lag:float, partial:bool=False): # emit the counts of the window that starts at start, and reset the counts
+        self.emit({
+            'start': start,
+            'end': start + self.window,
+            'counts': [dict({key: len(frame_counter[key]) for key in frame_counter}, color=roi.get('color'), name=roi.get('name')) for roi, frame_counter in zip(self.rois, self.frame_counter)],
+            'dropped': dropped, # the number of frames dropped in the window
+            'lag': lag, # the largest delay between the capture and the processing of a frame in the window, in seconds
+            'behind': dropped > 0, # the model could not keep up with the stream
+            'partial': partial, # the stream ended before the end of the window
+            'stats': self.stats() # the time of each stage in the window
+        })
+        self.timer = StageTimer() # the samples of the next window, so that the memory doesn't grow with the stream
+        for frame_counter in self.frame_counter + self.occupancy:
+            for key in frame_counter:
+                frame_counter[key].clear()
+        for dwell in self.dwell: # the tracks inside the polygons start again in the next window
+            dwell.clear()
+        self.frames_seen.clear()
+
+    def run(self): # process the stream until it ends
+        source = LiveSource(self.source, self.queue_size, self.realtime)
+        window_start = 0.0
+        dropped = 0 # the number of frames dropped before the current window
+        lag = 0.0
+        try:
+            for index, (timestamp, frame) in enumerate(source):
+                while timestamp >= window_start + self.window: # the frame is after the end of the window, so the window is closed
+                    self.close_window(window_start, source.dropped - dropped, lag)
+                    window_start += self.window
+                    dropped = source.dropped
+                    lag = 0.0
+                self.process_batch([frame], [index]) # one frame at a time, so that the counts are never late because of a batch
+                lag = max(lag, time.perf_counter() - source.start - timestamp)
+                if index % PRUNE_EVERY == 0:
+                    self.prune(index)
+        finally:
+            source.close()
+        self.close_window(window_start, source.dropped - dropped, lag, partial=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", required=True, help="RTSP url, camera index or video file")
+    parser.add_argument("--line", type=int, nargs=4, action="append", default=[], metavar=("X1", "Y1", "X2", "Y2"), help="a line to count the crossings of(can be repeated)")
+    parser.add_argument("--polygon", type=int, nargs="+", action="append", default=[], metavar="X Y", help="the points of a polygon to count the entries of(can be repeated)")
+    parser.add_argument("--window", type=float, default=WINDOW, help="length of the count windows in seconds")
+    parser.add_argument("--model", default="models/yolov8x.pt", help="path to the model(.pt, .onnx or OpenVINO directory)")
+    parser.add_argument("--backend", choices=list(BACKENDS), default="ultralytics", help="detector backend of the model")
+    parser.add_argument("--imgsz", type=int, default=IMGSZ, help="input size of the model")
+    parser.add_argument("--fast", action="store_true", help="read a video file as fast as the model processes it without dropping frames, instead of at its frame rate like a camera")
+    args = parser.parse_args() # Parse the arguments
+
+    detector = load_detector(args.backend, args.model, args.imgsz)
+    source = int(args.source) if args.source.isdigit() else args.source # a camera index or a url/file
+    rois = [{'start': line[:2], 'end': line[2:], 'color': f'line{i}', 'name': f'line{i}'} for i, line in enumerate(args.line)]
+    rois += [{'type': 'polygon', 'points': list(zip(points[::2], points[1::2])), 'color': f'polygon{i}', 'name': f'polygon{i}'} for i, points in enumerate(args.polygon)]
+    if not rois:
+        parser.error("at least one --line or --polygon is required")
+    StreamCounter(rois, source, detector, args.window, lambda window: print(json.dumps(window), flush=True), realtime=False if args.fast else None).run()
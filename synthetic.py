@@ -0,0 +1,112 @@
+# Description: This module contains the synthetic scenes shared by the benchmarks and the tests: objects with known crossings, their detections, their videos and a counter that reads them with the stub detector, and the legacy functions that the vectorized ones are tested against.
+
+# Import necessary libraries
+import cv2
+import numpy as np
+from counter import Counter
+from detectors import STUB_CLASSES, STUB_LEVELS, StubDetector
+
+# the classes of the synthetic objects: the selected classes + some classes that should be filtered out(traffic light, stop sign)
+SYNTHETIC_CLASSES = STUB_CLASSES
+# the gray level of each class in the synthetic videos, so that the stub detector knows the class of each rectangle
+CLASS_LEVELS = STUB_LEVELS
+
+# a function that generates synthetic objects moving from the left to the right of the frame, crossing the vertical line in the middle of the frame
+# each object moves at most 0.3 of its size per frame, so that the boxes of consecutive frames overlap enough for the byte tracker
+# if active_fraction < 1, the objects only appear in the first active_fraction of every 300 frames, so that the video has long static stretches
+# if separate, the objects that would touch an object generated before them are dropped, so that every object stays one box of the stub detector and one track(the ground truth of scene_crossings is then exact)
+def synthetic_scene(num_frames, num_objects, width=1920, height=1080, seed=0, active_fraction=1.0, separate=False):
+    rng = np.random.default_rng(seed)
+    class_id = rng.choice(SYNTHETIC_CLASSES, num_objects)
+    start = rng.integers(0, num_frames, num_objects) # the frame at which the object appears
+    if active_fraction < 1:
+        start = start // 300 * 300 + (start % 300 * active_fraction).astype(int)
+    step = rng.uniform(0.1, 0.3, num_objects) # pixels per frame, as a fraction of the size
+    y = rng.uniform(0.1, 0.9, num_objects) * height
+    size = rng.uniform(40, 120, num_objects) * height / 1080
+    speed = step * size # pixels per frame
+    kept = np.ones(num_objects, dtype=bool)
+    if separate:
+        x = (np.arange(num_frames)[:, None] - start) * speed # x coordinate of the center of each object in each frame, like scene_boxes
+        visible = (x >= 0) & (x < width)
+        for i in range(num_objects):
+            near = kept[:i].nonzero()[0]
+            near = near[np.abs(y[near] - y[i]) < (size[near] + size[i]) / 2 + 4] # the kept objects in the same rows of the frame, with a margin for the noise of the video
+            touch = visible[:, near] & visible[:, i, None] & (np.abs(x[:, near] - x[:, i, None]) < (size[near] + size[i]) / 2 + 4)
+            kept[i] = not touch.any()
+    return {
+        'class_id': class_id[kept],
+        'start': start[kept],
+        'speed': speed[kept],
+        'y': y[kept],
+        'size': size[kept],
+        'width': width,
+    }
+
+# a function that returns the boxes and the classes of the visible objects of a scene in one frame
+def scene_boxes(objects, index):
+    x = (index - objects['start']) * objects['speed'] # x coordinate of the center of each object
+    visible = (index >= objects['start']) & (x < objects['width'])
+    x, y, size = x[visible], objects['y'][visible], objects['size'][visible]
+    return np.stack([x - size / 2, y - size / 2, x + size / 2, y + size / 2], axis=1), objects['class_id'][visible]
+
+# a function that returns the ground truth of a scene: the frame at which each object crosses the vertical line at line_x, by class id
+# an object crosses at the first frame where its whole box is right of the line, if it is still visible(center inside the frame) at that frame
+def scene_crossings(objects, num_frames, line_x):
+    frames = objects['start'] + np.floor((line_x + objects['size'] / 2) / objects['speed']).astype(int) + 1
+    visible = (frames < num_frames) & ((frames - objects['start']) * objects['speed'] < objects['width'])
+    return {int(class_id): np.sort(frames[visible & (objects['class_id'] == class_id)]).tolist() for class_id in np.unique(objects['class_id'])}
+
+# a function that generates synthetic detections of the objects of a scene, with some noise like a real detector
+# returns a list that contains (xyxy, confidence, class_id) for each frame
+def synthetic_detections(num_frames, num_objects, width=1920, height=1080, seed=0, active_fraction=1.0):
+    objects = synthetic_scene(num_frames, num_objects, width, height, seed, active_fraction)
+    rng = np.random.default_rng(seed + 1)
+    frames = []
+    for index in range(num_frames):
+        xyxy, class_id = scene_boxes(objects, index)
+        xyxy = (xyxy + rng.normal(0, 1, (len(xyxy), 1))).astype(np.float32) # add some noise to the boxes like a real detector
+        confidence = rng.uniform(0.5, 0.95, len(xyxy)).astype(np.float32)
+        frames.append((xyxy, confidence, class_id))
+    return frames
+
+# a function that writes a synthetic video of the objects of a scene(filled rectangles with the gray level of their class on a black background), used by the benchmarks that need to decode a real video file
+def synthetic_video(path, num_frames, objects=None, width=1920, height=1080, fps=30):
+    objects = objects if objects is not None else synthetic_scene(num_frames, 60, width, height)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    for index in range(num_frames):
+        frame = np.zeros((height, width, 3), dtype=np.uint8)
+        xyxy, class_id = scene_boxes(objects, index)
+        for (x1, y1, x2, y2), c in zip(xyxy.astype(int), class_id):
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (CLASS_LEVELS[c],) * 3, -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+# a counter of a synthetic video that uses the stub detector instead of YOLO: it finds the rectangles of each gray level of the video
+class PixelCounter(Counter):
+    def __init__(self, rois:list, video_file:str):
+        super().__init__(rois, 'synthetic', StubDetector())
+        self.video_file = video_file # use the path as it is, instead of the assets folder of the server
+
+# the count_intervals function used before the vectorized one: a python loop over every number and every interval
+def legacy_count_intervals(numbers, max_value, num_intervals):
+    intervals = np.linspace(0, max_value, num_intervals + 1)
+    counts = np.zeros(num_intervals)
+    for number in numbers:
+        for i in range(num_intervals):
+            if intervals[i] < number <= intervals[i + 1]:
+                counts[i] += 1
+    return counts.tolist()
+
+# a function that returns num_zones random lines and num_zones random polygons(convex, 3 to 8 points around a random center) in a frame of width x height
+def random_zones(num_zones, width=1920, height=1080, seed=0):
+    rng = np.random.default_rng(seed)
+    lines = [(tuple(rng.integers(0, [width, height]).tolist()), tuple(rng.integers(0, [width, height]).tolist())) for _ in range(num_zones)]
+    polygons = []
+    for _ in range(num_zones):
+        center, radius = rng.integers([100, 100], [width - 100, height - 100]), rng.integers(50, 300)
+        angles = np.sort(rng.uniform(0, 2 * np.pi, rng.integers(3, 9)))
+        points = center + radius * np.stack([np.cos(angles), np.sin(angles)], axis=1)
+        polygons.append(np.clip(points, 0, [width - 1, height - 1]).astype(int).tolist())
+    return lines, polygons
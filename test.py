@@ -2,19 +2,17 @@ import socket
 import json
 import cv2
 import numpy as np
-import darknet
+from detectors import DarknetDetector
+from tracks import IoUTracker, inside_rois
 
 # Load YOLO model using Darknet
 config_path = "./yolov3.cfg"
 weights_path = "./yolov3.weights"
 meta_path = "./coco.data"
+BATCH_SIZE = 4 # number of frames that the network processes at once
 
-network, class_names, class_colors = darknet.load_network(
-    config_path,
-    meta_path,
-    weights_path,
-    batch_size=1
-)
+detector = DarknetDetector(config_path, weights=weights_path, data=meta_path, module='darknet', batch_size=BATCH_SIZE, threshold=0.5) # the image buffer of the network is allocated once
+class_names, class_colors = detector.class_names, detector.class_colors
 
 # Function to receive ROI coordinates
 def receive_roi_coordinates():
@@ -46,37 +44,43 @@ cap = cv2.VideoCapture("road_video.mp4")
 
 cyclist_count = 0
 pedestrian_count = 0
-
-while cap.isOpened():
-    ret, frame = cap.read()
-    if not ret:
+tracker = IoUTracker() # link the boxes of consecutive frames, so that each object is counted once
+rois = np.array([[roi["x1"], roi["y1"], roi["x2"], roi["y2"]] for roi in roi_coordinates])
+counted = [set() for roi in roi_coordinates] # the track ids that already entered each ROI
+
+stop = False
+while cap.isOpened() and not stop:
+    frames = [] # read BATCH_SIZE frames and detect them with one call
+    while len(frames) < BATCH_SIZE:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    if not frames:
         break
 
-    darknet_image = darknet.make_image(frame.shape[1], frame.shape[0], 3)
-    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    darknet.copy_image_from_bytes(darknet_image, frame_rgb.tobytes())
-
-    detections = darknet.detect_image(network, class_names, darknet_image, thresh=0.5)
-    darknet.free_image(darknet_image)
-
-    for label, confidence, bbox in detections:
-        x, y, w, h = map(int, bbox)
-        for roi in roi_coordinates:
-            x1, y1, x2, y2 = roi["x1"], roi["y1"], roi["x2"], roi["y2"]
-            if (x - w // 2 > x1 and x + w // 2 < x2 and y - h // 2 > y1 and y + h // 2 < y2):
-                color = class_colors[label]
+    for frame, detections in zip(frames, detector.detect(frames)):
+        tracker_id = tracker.update(detections.xyxy, detections.class_id)
+        inside = inside_rois(detections.xyxy, rois) # the boxes inside each ROI, checked for all ROIs and boxes at once
+        for r, b in zip(*np.nonzero(inside)):
+            label = class_names[detections.class_id[b]]
+            x1, y1, x2, y2 = rois[r]
+            if tracker_id[b] not in counted[r]: # count each track only the first time it is inside the ROI
                 if is_cyclist(label):
+                    counted[r].add(tracker_id[b])
                     cyclist_count += 1
                     print(f"Cyclist entered ROI. Count: {cyclist_count}")
                 elif is_pedestrian(label):
+                    counted[r].add(tracker_id[b])
                     pedestrian_count += 1
                     print(f"Pedestrian entered ROI. Count: {pedestrian_count}")
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
 
-    cv2.imshow("Frame", frame)
-    key = cv2.waitKey(1)
-    if key == 27:  # Press 'ESC' to exit
-        break
+        cv2.imshow("Frame", frame)
+        key = cv2.waitKey(1)
+        if key == 27:  # Press 'ESC' to exit
+            stop = True
+            break
 
 cap.release()
 cv2.destroyAllWindows()
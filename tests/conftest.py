@@ -0,0 +1,16 @@
+# Description: This module contains the fixtures shared by the tests.
+
+# Import necessary libraries
+import pytest
+
+# the tracked detections of a short synthetic scene, and the counter that recorded their tracks(a line in the middle of the frame that the objects cross)
+@pytest.fixture(scope='module')
+def tracked():
+    sv = pytest.importorskip('supervision')
+    from counter import Counter
+    from synthetic import synthetic_detections
+    counter = Counter([{'start': (960, 0), 'end': (960, 1080)}], 'synthetic')
+    frames = [
+        counter.update(sv.Detections(xyxy=xyxy.copy(), confidence=confidence.copy(), class_id=class_id.copy()), index) for index, (xyxy, confidence, class_id) in enumerate(synthetic_detections(120, 20))
+    ]
+    return counter, frames
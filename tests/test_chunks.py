@@ -0,0 +1,24 @@
+# Description: This module tests that processing the chunks of a video in parallel gives the same per-interval counts as processing it in order.
+
+# Import necessary libraries
+import pytest
+pytest.importorskip('numpy')
+pytest.importorskip('cv2')
+pytest.importorskip('supervision')
+from synthetic import PixelCounter, synthetic_scene, synthetic_video
+
+WIDTH, HEIGHT = 1280, 720
+
+@pytest.fixture(scope='module')
+def video(tmp_path_factory): # a short synthetic video with objects crossing the line in the middle
+    path = str(tmp_path_factory.mktemp('chunks') / 'synthetic.mp4')
+    return synthetic_video(path, 450, synthetic_scene(450, 20, WIDTH, HEIGHT), WIDTH, HEIGHT)
+
+@pytest.mark.parametrize('chunks', [2, 3])
+def test_chunks_match_sequential(video, chunks):
+    rois = [{'start': (WIDTH // 2, 0), 'end': (WIDTH // 2, HEIGHT), 'intervals': 6}]
+    expected = PixelCounter(rois, video).process()
+    assert not isinstance(expected, dict), expected
+    assert sum(sum(expected[0][key]) for key in expected[0] if key != 'skipped') > 0 # the line is crossed
+    result = PixelCounter(rois, video).process(chunks=chunks, chunk_overlap=150)
+    assert result == expected
@@ -0,0 +1,33 @@
+# Description: This module tests the edge cases of the vectorized interval counting against the legacy function.
+
+# Import necessary libraries
+import pytest
+np = pytest.importorskip('numpy')
+pytest.importorskip('cv2') # counter and synthetic need opencv and supervision
+pytest.importorskip('supervision')
+from synthetic import legacy_count_intervals
+from counter import count_class_intervals, count_intervals, interval_edges
+
+def test_no_crossing():
+    assert count_intervals([], 100, 4) == [0.0] * 4
+
+def test_crossing_at_the_first_frame_is_counted(): # the legacy function dropped it
+    assert count_intervals([0], 100, 4) == [1.0, 0.0, 0.0, 0.0]
+
+def test_intervals_are_closed_on_the_right():
+    assert count_intervals([25, 26, 100], 100, 4) == [1.0, 1.0, 0.0, 1.0]
+
+def test_numbers_outside_the_video_are_not_counted():
+    assert count_intervals([-1, 101], 100, 4) == [0.0] * 4
+
+def test_interval_length_with_a_partial_last_interval(): # intervals of 2 seconds at 30 fps
+    assert count_class_intervals({'car': [0, 60, 61], 'bus': [90]}, interval_edges(90, interval_length=60)) == {'car': [2.0, 1.0], 'bus': [0.0, 1.0]}
+
+def test_empty_video():
+    assert count_class_intervals({'car': []}, interval_edges(0, 6)) == {'car': [0.0] * 6}
+
+def test_same_counts_as_the_legacy_function():
+    rng = np.random.default_rng(0)
+    numbers = {key: rng.integers(1, 1000, 200).tolist() for key in ['person', 'car', 'bus']}
+    counts = count_class_intervals(numbers, interval_edges(1000, 7))
+    assert counts == {key: legacy_count_intervals(numbers[key], 1000, 7) for key in numbers}
@@ -0,0 +1,47 @@
+# Description: This module tests the wire protocol with a loopback TCP connection.
+
+# Import necessary libraries
+import socket
+import threading
+import pytest
+import protocol
+
+ENCODINGS = [protocol.JSON] + ([protocol.MSGPACK] if protocol.msgpack is not None else [])
+
+# a result message of several megabytes, larger than any single recv
+def large_message(intervals=100000):
+    return [{'person': [float(i % 100) for i in range(intervals)], 'color': color} for color in ['blue', 'green', 'red']]
+
+@pytest.mark.parametrize('encoding', ENCODINGS)
+def test_loopback_receives_the_whole_message(encoding):
+    message = large_message()
+    assert len(protocol.encode(message, encoding)) > 1024 * 1024
+    with socket.create_server(('127.0.0.1', 0)) as listener:
+        received = []
+        def receive(): # the receiving side reads one message
+            conn, _ = listener.accept()
+            with conn:
+                received.append(protocol.recv_message(conn))
+        thread = threading.Thread(target=receive)
+        thread.start()
+        with socket.create_connection(listener.getsockname()) as s:
+            protocol.send_message(s, protocol.RESULT, message, encoding)
+        thread.join(timeout=10)
+    message_type, body, received_encoding = received[0]
+    assert (message_type, received_encoding) == (protocol.RESULT, encoding)
+    assert body == message
+
+def test_refuses_bodies_larger_than_the_limit():
+    left, right = socket.socketpair()
+    with left, right:
+        left.sendall(protocol.HEADER.pack(protocol.RESULT, protocol.JSON, protocol.MAX_MESSAGE_SIZE + 1))
+        with pytest.raises(ValueError):
+            protocol.recv_message(right)
+
+def test_connection_closed_in_the_middle_of_a_message():
+    left, right = socket.socketpair()
+    with right:
+        left.sendall(protocol.HEADER.pack(protocol.RESULT, protocol.JSON, 100) + b'[1, 2')
+        left.close()
+        with pytest.raises(ConnectionError):
+            protocol.recv_message(right)
@@ -0,0 +1,31 @@
+# Description: This module tests that the crossings answered by the TrackStore are the same as the crossings of sv.LineZone on the same tracks.
+
+# Import necessary libraries
+import pytest
+np = pytest.importorskip('numpy')
+pytest.importorskip('cv2') # counter needs opencv
+sv = pytest.importorskip('supervision')
+
+# the frame, the class and the direction of every crossing of sv.LineZone replayed frame by frame
+def line_zone_crossings(frames, start, end):
+    line_zone = sv.LineZone(start=sv.Point(*start), end=sv.Point(*end))
+    expected = []
+    for index, detections in enumerate(frames):
+        crossed_in, crossed_out = line_zone.trigger(detections)
+        expected += [(index, int(class_id), True) for class_id in detections.class_id[crossed_in]]
+        expected += [(index, int(class_id), False) for class_id in detections.class_id[crossed_out]]
+    return sorted(expected)
+
+def random_lines(count, seed=1):
+    rng = np.random.default_rng(seed)
+    return [(tuple(rng.integers(0, [1920, 1080]).tolist()), tuple(rng.integers(0, [1920, 1080]).tolist())) for _ in range(count)]
+
+@pytest.mark.parametrize('line', [((960, 0), (960, 1080)), ((960, 1080), (960, 0))] + random_lines(5))
+def test_crossings_match_line_zone(tracked, line):
+    counter, frames = tracked
+    crossings = sorted(zip(*[column.tolist() for column in counter.tracks.crossings(*line)]))
+    assert crossings == line_zone_crossings(frames, *line)
+
+def test_the_tracking_line_is_crossed(tracked):
+    counter, _ = tracked
+    assert len(counter.tracks.crossings((960, 0), (960, 1080))[0]) > 0
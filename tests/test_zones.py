@@ -0,0 +1,52 @@
+# Description: This module tests the vectorized lines and polygons against one sv.LineZone and one sv.PolygonZone for each zone, and the polygon results of the counter.
+
+# Import necessary libraries
+import pytest
+np = pytest.importorskip('numpy')
+pytest.importorskip('cv2') # counter needs opencv
+sv = pytest.importorskip('supervision')
+from counter import Counter
+from synthetic import random_zones
+from zones import LineSet, PolygonSet
+
+@pytest.mark.parametrize('num_zones', [1, 10])
+def test_line_set_matches_line_zone(tracked, num_zones):
+    _, frames = tracked
+    lines, _ = random_zones(num_zones)
+    lines[0] = ((960, 0), (960, 1080)) # a line that the objects cross
+    line_zones = [sv.LineZone(start=sv.Point(*start), end=sv.Point(*end)) for start, end in lines]
+    line_set = LineSet(lines)
+    for detections in frames:
+        expected = np.array([np.logical_or(*line_zone.trigger(detections)) for line_zone in line_zones]).reshape(num_zones, len(detections))
+        assert np.array_equal(line_set.trigger(detections.tracker_id, detections.xyxy), expected)
+
+@pytest.mark.parametrize('num_zones', [1, 9, 20])
+def test_polygon_set_matches_polygon_zone(tracked, num_zones): # 9 and 20 polygons use more than one byte of the packed masks
+    _, frames = tracked
+    _, polygons = random_zones(num_zones)
+    polygons[0] = [(900, 0), (1020, 0), (1020, 1080), (900, 1080)] # a polygon that the objects go through
+    polygon_zones = [sv.PolygonZone(polygon=np.array(polygon), triggering_anchors=(sv.Position.BOTTOM_CENTER,)) for polygon in polygons]
+    polygon_set = PolygonSet(polygons)
+    for detections in frames:
+        expected = np.array([polygon_zone.trigger(detections) for polygon_zone in polygon_zones]).reshape(num_zones, len(detections))
+        assert np.array_equal(polygon_set.trigger(detections.xyxy), expected)
+
+def test_polygon_anchors_are_rounded_like_polygon_zone(): # half pixels are rounded to even, the bottom center of these boxes is on the edges of the polygon
+    polygon = [(10, 10), (20, 10), (20, 20), (10, 20)]
+    xyxy = np.array([[8, 0, 11, 20.5], [8, 0, 11, 19.5], [19, 0, 22, 15.5], [19, 0, 23, 15.5], [-5, 0, 5, 15], [30, 0, 40, 15]], dtype=np.float32)
+    expected = sv.PolygonZone(polygon=np.array(polygon), triggering_anchors=(sv.Position.BOTTOM_CENTER,)).trigger(sv.Detections(xyxy=xyxy))
+    assert np.array_equal(PolygonSet([polygon]).trigger(xyxy)[0], expected)
+
+def test_polygon_needs_three_points():
+    with pytest.raises(ValueError):
+        PolygonSet([[(0, 0), (10, 10)]])
+
+def test_polygon_counts_each_track_once():
+    counter = Counter([{'type': 'polygon', 'points': [(0, 0), (200, 0), (200, 200), (0, 200)]}], 'synthetic')
+    box = np.array([[50, 50, 100, 100]], dtype=np.float32)
+    for index in range(10): # one car that stays inside the polygon
+        counter.update(sv.Detections(xyxy=box.copy(), confidence=np.array([0.9], dtype=np.float32), class_id=np.array([2])), index)
+    result = counter.intervals(10, 10.0)[0]
+    assert sum(result['car']) == 1
+    assert result['dwell']['car'] > 0
+    assert sum(result['occupancy']['car']) > 0
@@ -0,0 +1,78 @@
+# Description: This module contains the store of the tracks of a video. After the first pass, the position of each track in each frame is kept, so that the crossings of any new line are answered with one vectorized query over all the tracks instead of replaying the tracker and the line zones frame by frame.
+
+# Import necessary libraries
+import numpy as np
+import supervision as sv
+from zones import line_sides
+
+# a class that keeps the box and the class of each track in each frame, sorted by track and frame
+class TrackStore:
+    def __init__(self, tracker_id=None, frame=None, class_id=None, xyxy=None):
+        self.chunks = [] # the tracked detections of each frame, appended while tracking and concatenated on the first query
+        self.tracker_id = tracker_id
+        self.frame = frame
+        self.class_id = class_id
+        self.xyxy = xyxy
+
+    def append(self, detections: sv.Detections, index:int): # add the tracked detections of one frame
+        if len(detections) > 0:
+            self.chunks.append((detections.tracker_id, np.full(len(detections), index), detections.class_id, detections.xyxy.copy()))
+
+    def columns(self): # concatenate the appended frames and sort the rows by track and frame
+        if self.chunks:
+            tracker_id, frame, class_id, xyxy = [np.concatenate(column) for column in zip(*self.chunks)]
+            if self.tracker_id is not None: # keep the rows that were already in the store
+                tracker_id, frame, class_id, xyxy = [np.concatenate([old, new]) for old, new in zip((self.tracker_id, self.frame, self.class_id, self.xyxy), (tracker_id, frame, class_id, xyxy))]
+            order = np.lexsort((frame, tracker_id))
+            self.tracker_id, self.frame, self.class_id, self.xyxy = tracker_id[order], frame[order], class_id[order], xyxy[order]
+            self.chunks = []
+        if self.tracker_id is None: # no frame was appended
+            return np.empty(0, dtype=int), np.empty(0, dtype=int), np.empty(0, dtype=int), np.empty((0, 4))
+        return self.tracker_id, self.frame, self.class_id, self.xyxy
+
+    def crossings(self, start:tuple, end:tuple): # a function that returns the frame, the class and the direction(True = in) of every crossing of the line from start to end, with the same rules as sv.LineZone
+        tracker_id, frame, class_id, xyxy = self.columns()
+        valid, side = line_sides([start], [end], xyxy) # the same test as the line set of the counter
+        valid, side = valid[0], side[0]
+        tracker_id, frame, class_id, state = tracker_id[valid], frame[valid], class_id[valid], side[valid]
+        crossed = np.nonzero((tracker_id[1:] == tracker_id[:-1]) & (state[1:] != state[:-1]))[0] + 1 # the side of the track changed since its last valid frame
+        return frame[crossed], class_id[crossed], state[crossed]
+
+# a function that tells which boxes are completely inside each rectangle ROI, with one broadcast over all ROIs and boxes
+# rois: (x1, y1, x2, y2) of each ROI(the corners can be in any order), returns a (number of ROIs, number of boxes) boolean array
+def inside_rois(xyxy: np.ndarray, rois: np.ndarray):
+    rois = np.asarray(rois, dtype=np.float64).reshape(-1, 4)
+    low, high = np.minimum(rois[:, :2], rois[:, 2:]), np.maximum(rois[:, :2], rois[:, 2:])
+    return ((xyxy[None, :, :2] > low[:, None]) & (xyxy[None, :, 2:] < high[:, None])).all(axis=2)
+
+# a lightweight tracker that links the boxes of consecutive frames by IoU(same class only), used by the darknet scripts that have no byte tracker
+class IoUTracker:
+    def __init__(self, iou_threshold:float=0.3, max_age:int=15):
+        self.iou_threshold = iou_threshold # minimum IoU of a box with the last box of a track to continue the track
+        self.max_age = max_age # number of frames a track is kept without a matching box
+        self.xyxy = np.empty((0, 4)) # the last box of each active track
+        self.class_id = np.empty(0, dtype=int)
+        self.tracker_id = np.empty(0, dtype=int)
+        self.age = np.empty(0, dtype=int) # the number of frames since the track was last matched
+        self.next_id = 1
+
+    def update(self, xyxy: np.ndarray, class_id: np.ndarray): # a function that takes the boxes and classes of one frame and returns the track id of each box
+        ious = sv.box_iou_batch(xyxy, self.xyxy) if len(xyxy) and len(self.xyxy) else np.zeros((len(xyxy), len(self.xyxy)))
+        ious[class_id[:, None] != self.class_id[None, :]] = 0 # a track never changes class
+        tracker_id = np.zeros(len(xyxy), dtype=int)
+        matched = np.zeros(len(self.xyxy), dtype=bool)
+        rows, cols = np.nonzero(ious >= self.iou_threshold)
+        for i in np.argsort(-ious[rows, cols]): # greedy matching, the pairs with the largest IoU first
+            box, track = rows[i], cols[i]
+            if tracker_id[box] == 0 and not matched[track]:
+                tracker_id[box] = self.tracker_id[track]
+                matched[track] = True
+        new = tracker_id == 0
+        tracker_id[new] = np.arange(self.next_id, self.next_id + new.sum()) # the unmatched boxes start new tracks
+        self.next_id += int(new.sum())
+        kept = ~matched & (self.age < self.max_age) # the unmatched tracks that are not too old
+        self.xyxy = np.concatenate([self.xyxy[kept], xyxy])
+        self.class_id = np.concatenate([self.class_id[kept], class_id])
+        self.tracker_id = np.concatenate([self.tracker_id[kept], tracker_id])
+        self.age = np.concatenate([self.age[kept] + 1, np.zeros(len(xyxy), dtype=int)])
+        return tracker_id
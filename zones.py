@@ -0,0 +1,75 @@
+# Description: This module contains the zones of the counter: any number of lines and polygons, each kind evaluated for all its zones at once with numpy, so that the per-frame cost grows slowly with the number of zones.
+
+# Import necessary libraries
+import cv2
+import numpy as np
+
+# a function that tells, for every line and every box, if the box is valid for the line(completely on one side and between the perpendiculars of the line at its ends) and on which side it is, with the same rules as sv.LineZone
+# starts, ends: (number of lines, 2), xyxy: (number of boxes, 4), returns two (number of lines, number of boxes) boolean arrays
+def line_sides(starts, ends, xyxy: np.ndarray):
+    starts = np.asarray(starts, dtype=np.float64).reshape(-1, 2)
+    vectors = np.asarray(ends, dtype=np.float64).reshape(-1, 2) - starts
+    x1, y1, x2, y2 = np.asarray(xyxy, dtype=np.float64).reshape(-1, 4).T
+    anchors_x = np.stack([x1, x2, x1, x2], axis=1)[None] - starts[:, 0, None, None] # the four corners of each box, the triggering anchors of sv.LineZone
+    anchors_y = np.stack([y2, y2, y1, y1], axis=1)[None] - starts[:, 1, None, None]
+    projection = vectors[:, 0, None, None] * anchors_x + vectors[:, 1, None, None] * anchors_y
+    in_limits = ((projection >= 0) & (projection <= (vectors ** 2).sum(axis=1)[:, None, None])).all(axis=2) # every anchor is between the perpendiculars of the line at start and end
+    side = (vectors[:, 0, None, None] * anchors_y - vectors[:, 1, None, None] * anchors_x) < 0 # the side of the line of each anchor(the sign of the cross product)
+    valid = in_limits & (side.all(axis=2) | ~side.any(axis=2)) # the box is completely on one side of the line
+    return valid, side[:, :, 0]
+
+# a class that counts the crossings of any number of lines, with one vectorized test of all the lines and tracked boxes of a frame
+class LineSet:
+    def __init__(self, lines:list):
+        self.starts = np.array([start for start, _ in lines], dtype=np.float64).reshape(-1, 2)
+        self.ends = np.array([end for _, end in lines], dtype=np.float64).reshape(-1, 2)
+        self.unknown = np.full(len(lines), -1, dtype=np.int8) # the state of a track that was never valid for a line
+        self.state = {} # tracker id --> the side of the track for each line(-1 = unknown)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def trigger(self, tracker_id: np.ndarray, xyxy: np.ndarray): # a function that takes the tracked boxes of one frame and returns which box crossed which line, a (number of lines, number of boxes) boolean array
+        if len(self) == 0 or len(xyxy) == 0:
+            return np.zeros((len(self), len(xyxy)), dtype=bool)
+        valid, side = line_sides(self.starts, self.ends, xyxy)
+        previous = np.stack([self.state.get(track, self.unknown) for track in tracker_id], axis=1)
+        crossed = valid & (previous >= 0) & (previous != side) # the side of the track changed since its last valid frame
+        current = np.where(valid, side, previous).astype(np.int8)
+        for track, state in zip(tracker_id, current.T):
+            self.state[track] = state
+        return crossed
+
+    def forget(self, tracker_ids): # remove the state of the tracks that are gone
+        for track in tracker_ids:
+            self.state.pop(track, None)
+
+# a class that tells which tracked boxes are inside any number of polygons, with one lookup in a bit-packed mask of all the polygons(one bit for each polygon)
+# the anchor of each box is its bottom center, like sv.PolygonZone(the anchors outside the masks are outside every polygon)
+class PolygonSet:
+    def __init__(self, polygons:list):
+        self.polygons = [np.asarray(polygon, dtype=np.int32).reshape(-1, 2) for polygon in polygons]
+        if any(len(polygon) < 3 for polygon in self.polygons):
+            raise ValueError("a polygon zone needs at least 3 points")
+        points = np.concatenate(self.polygons + [np.zeros((1, 2), dtype=np.int32)])
+        self.width, self.height = np.maximum(points.max(axis=0) + 1, 1) # the masks only need to cover the polygons
+        self.masks = np.zeros((self.height, self.width, (len(self.polygons) + 7) // 8), dtype=np.uint8)
+        for i, polygon in enumerate(self.polygons): # each polygon is only filled in its bounding box, not in a full-frame plane
+            x1, y1 = np.maximum(polygon.min(axis=0), 0)
+            x2, y2 = polygon.max(axis=0) + 1
+            if x2 <= x1 or y2 <= y1: # the polygon is outside the frame
+                continue
+            plane = np.zeros((y2 - y1, x2 - x1), dtype=np.uint8)
+            cv2.fillPoly(plane, [polygon - (x1, y1)], 1)
+            self.masks[y1:y2, x1:x2, i // 8] |= plane << (7 - i % 8) # the bit order of np.unpackbits
+
+    def __len__(self):
+        return len(self.polygons)
+
+    def trigger(self, xyxy: np.ndarray): # a function that takes the boxes of one frame and returns which box is inside which polygon, a (number of polygons, number of boxes) boolean array
+        x = np.rint((xyxy[:, 0] + xyxy[:, 2]) / 2).astype(int) # rounded to the nearest pixel(half to even) like sv.PolygonZone
+        y = np.rint(xyxy[:, 3]).astype(int)
+        in_masks = (x >= 0) & (x < self.width) & (y >= 0) & (y < self.height)
+        bits = np.zeros((len(xyxy), self.masks.shape[2]), dtype=np.uint8)
+        bits[in_masks] = self.masks[y[in_masks], x[in_masks]]
+        return np.unpackbits(bits, axis=1)[:, :len(self.polygons)].T.astype(bool)